@@ -6,7 +6,7 @@ block_cipher = None
 
 a = Analysis(
     ['main.py'],
-    pathex=['.'],
+    pathex=['.', '..'],
     binaries=[],
     datas=[],
     hiddenimports=[
@@ -27,7 +27,6 @@ a = Analysis(
             'http', 
             'xml', 
             'logging', 
-            'multiprocessing', 
             'distutils', 
             'pydoc'],
     win_no_prefer_redirects=False,
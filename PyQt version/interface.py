@@ -1,25 +1,37 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGroupBox,
                             QScrollArea, QTabWidget, QFormLayout, QFileDialog, QAction, QMessageBox, QPushButton)
-from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
 from PyQt5.QtGui import QImage, QPixmap
+from common.metrics import metrics
 from controls import Switch, create_param_group, create_tab
 from video_processing import VideoThread
 
+# Processus d'inférence séparés (0 : modèles dans le processus de l'interface)
+INFERENCE_WORKERS = 0
+# Cadence visée, par ex. 24 : en dessous, la qualité baisse par paliers
+# (None : qualité fixe)
+TARGET_FPS = None
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Interactive Video Effects")
         self.disply_width = 640
         self.display_height = 480
-        self.thread = VideoThread()
+        self.thread = VideoThread(inference_workers=INFERENCE_WORKERS, target_fps=TARGET_FPS)
 
         self.initUI()
         self.initMenu()
         self.show()
 
-        self.thread.change_pixmap_signal.connect(self.update_image)
+        self.thread.frame_ready_signal.connect(self.update_image)
         self.thread.recording_status_signal.connect(
             self.update_recording_status)
+        self.thread.recording_stats_signal.connect(
+            self.update_recording_stats)
+        self.thread.tracking_status_signal.connect(
+            self.update_tracking_status)
+        self.thread.quality_tier_signal.connect(self.quality_status.setText)
         self.thread.start()
 
     def initUI(self):
@@ -42,7 +54,23 @@ class MainWindow(QMainWindow):
         self.draw_button.setCheckable(True)
         self.draw_button.clicked.connect(self.toggle_drawing)
 
+        self.stats_button = QPushButton("Show Stats")
+        self.stats_button.setCheckable(True)
+        self.stats_button.clicked.connect(self.toggle_stats)
+
+        # Mesures affichées par-dessus l'image, mises à jour deux fois par
+        # seconde ; elles ne sont collectées que tant que l'affichage est actif
+        self.stats_overlay = QLabel(self.image_label)
+        self.stats_overlay.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 160); color: #ecf0f1; font-family: monospace;")
+        self.stats_overlay.move(5, 5)
+        self.stats_overlay.hide()
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats_overlay)
+
         self.recording_status = QLabel("Not Recording")
+        self.tracking_status = QLabel("Detected")
+        self.quality_status = QLabel(self.thread.governor.describe())
 
         self.effect_group_box = self.create_effects_group()
         _, param_scroll = self.create_param_widget()
@@ -53,7 +81,10 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(self.stop_button)
         button_layout.addWidget(self.capture_button)
         button_layout.addWidget(self.draw_button)
+        button_layout.addWidget(self.stats_button)
         button_layout.addWidget(self.recording_status)
+        button_layout.addWidget(self.tracking_status)
+        button_layout.addWidget(self.quality_status)
 
         # Layout principal horizontal
         main_layout = QHBoxLayout()
@@ -101,12 +132,21 @@ class MainWindow(QMainWindow):
             "Face Mask Parameters", "Face Mask Point Size", 1, 20, 5, self.on_facemask_point_size_changed)
         self.mirror_effect_intensity_slider = create_param_group(
             "Mirror Parameters", "Mirror Intensity", 1, 10, 1, self.on_mirror_intensity_changed)
+        self.background_blur_slider = create_param_group(
+            "Background Parameters", "Background Blur", 5, 60, 30, self.on_background_blur_changed)
+        self.keyframe_interval_slider = create_param_group(
+            "Tracking Parameters", "Detection Interval", 1, 10, 1, self.on_keyframe_interval_changed)
+        self.motion_threshold_slider = create_param_group(
+            "Motion Parameters", "Motion Threshold", 0, 50, 0, self.on_motion_threshold_changed)
 
         param_layout = QVBoxLayout()
         param_layout.addWidget(self.deformation_intensity_slider)
         param_layout.addWidget(self.pointillism_size_slider)
         param_layout.addWidget(self.facemask_point_size_slider)
         param_layout.addWidget(self.mirror_effect_intensity_slider)
+        param_layout.addWidget(self.background_blur_slider)
+        param_layout.addWidget(self.keyframe_interval_slider)
+        param_layout.addWidget(self.motion_threshold_slider)
         param_layout.addStretch()
 
         param_widget = QWidget()
@@ -159,32 +199,60 @@ class MainWindow(QMainWindow):
         self.thread.stop()
         event.accept()
 
-    def update_image(self, frame):
-        qt_image = self.convert_cv_qt(frame)
-        self.image_label.setPixmap(QPixmap.fromImage(qt_image))
+    def update_image(self):
+        frame = self.thread.take_display_frame()
+        if frame is None:
+            return
+        try:
+            with metrics.time("stage", "display"):
+                qt_image = self.convert_cv_qt(frame)
+                # La pixmap copie les pixels : le tampon peut être rendu ensuite
+                self.image_label.setPixmap(QPixmap.fromImage(qt_image))
+        finally:
+            self.thread.release_display_frame(frame)
 
     def update_recording_status(self, is_recording):
         self.recording_status.setText(
             "Recording" if is_recording else "Not Recording")
 
+    def update_recording_stats(self, stats):
+        text = "Recording ({} dropped, {} duplicated)".format(
+            stats["dropped"], stats["duplicated"])
+        if stats["lagging"]:
+            text = "Recording - writer can't keep up ({} dropped)".format(
+                stats["dropped"])
+        self.recording_status.setText(text)
+
+    def update_tracking_status(self, detected):
+        self.tracking_status.setText("Detected" if detected else "Propagated")
+
     @pyqtSlot()
     def on_checkbox_toggled(self):
         selected_effects = [
             effect for effect, switch in self.effect_switches.items() if switch.isChecked()]
-        self.thread.selected_effects = selected_effects
+        self.thread.set_selected_effects(selected_effects)
         self.update_param_visibility()
 
     def on_deformation_intensity_changed(self, value):
-        self.thread.deformation_intensity = value
+        self.thread.update_settings(deformation_intensity=value)
 
     def on_pointillism_size_changed(self, value):
-        self.thread.pointillism_size = value
+        self.thread.update_settings(pointillism_size=value)
 
     def on_facemask_point_size_changed(self, value):
-        self.thread.facemask_point_size = value
+        self.thread.update_settings(facemask_point_size=value)
 
     def on_mirror_intensity_changed(self, value):
-        self.thread.mirror_intensity = value
+        self.thread.update_settings(mirror_intensity=value)
+
+    def on_background_blur_changed(self, value):
+        self.thread.update_settings(background_blur=value)
+
+    def on_keyframe_interval_changed(self, value):
+        self.thread.tracker.interval = value
+
+    def on_motion_threshold_changed(self, value):
+        self.thread.tracker.motion_threshold = value
 
     def capture_screenshot(self):
         screenshot = self.image_label.pixmap()
@@ -210,12 +278,28 @@ class MainWindow(QMainWindow):
         self.draw_button.setText(
             "Disable Drawing" if self.thread.drawing else "Enable Drawing")
 
+    def toggle_stats(self):
+        enabled = self.stats_button.isChecked()
+        metrics.reset()
+        metrics.enabled = enabled
+        self.stats_overlay.setVisible(enabled)
+        self.stats_button.setText("Hide Stats" if enabled else "Show Stats")
+        if enabled:
+            self.stats_timer.start(500)
+        else:
+            self.stats_timer.stop()
+
+    def update_stats_overlay(self):
+        self.stats_overlay.setText(metrics.summary_text() or "Waiting for frames...")
+        self.stats_overlay.adjustSize()
+
     def update_param_visibility(self):
         effects_requiring_params = {
             "Deformation": ["deformation_intensity_slider"],
             "Pointillism": ["pointillism_size_slider"],
             "Face Mask": ["facemask_point_size_slider"],
-            "Mirror": ["mirror_effect_intensity_slider"]
+            "Mirror": ["mirror_effect_intensity_slider"],
+            "Background Distortion": ["background_blur_slider"]
         }
 
         visible_params = set()
@@ -223,17 +307,16 @@ class MainWindow(QMainWindow):
             if effect in effects_requiring_params:
                 visible_params.update(effects_requiring_params[effect])
 
-        for param_name in ["deformation_intensity_slider", "pointillism_size_slider", "facemask_point_size_slider", "mirror_effect_intensity_slider"]:
+        for param_name in ["deformation_intensity_slider", "pointillism_size_slider", "facemask_point_size_slider", "mirror_effect_intensity_slider", "background_blur_slider"]:
             param_widget = getattr(self, param_name)
             param_widget.setVisible(param_name in visible_params)
 
     def convert_cv_qt(self, cv_img):
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
+        # QImage lit directement les données BGR, sans conversion ni copie ;
+        # elle ne doit pas survivre au tableau cv_img
+        h, w, ch = cv_img.shape
         bytes_per_line = ch * w
-        convert_to_qt_format = QImage(
-            rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        return QImage(convert_to_qt_format)
+        return QImage(cv_img.data, w, h, bytes_per_line, QImage.Format_BGR888)
 
     def apply_styles(self):
         self.setStyleSheet("""
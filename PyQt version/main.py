@@ -1,8 +1,16 @@
+import multiprocessing
+import os
 import sys
+
+# Le dossier parent contient le paquet common partagé avec la version Web
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
 from PyQt5.QtWidgets import QApplication
 from interface import MainWindow
 
 if __name__ == "__main__":
+    # Nécessaire aux workers d'inférence dans l'exécutable PyInstaller
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     sys.exit(app.exec_())
@@ -1,9 +1,24 @@
 from setuptools import setup
+import os
 import py2exe
 import sys
 
+import mediapipe
+from mediapipe.python.solutions import download_utils
+
 sys.setrecursionlimit(5000)
 
+# Modèles de Pose lite, full et heavy (model_complexity 0 à 2, choisis par
+# les paliers de qualité). Le paquet mediapipe ne contient que full : les
+# autres sont téléchargés ici, à la construction, et non par l'application
+# pendant l'inférence.
+POSE_LANDMARK_MODELS = [
+    'mediapipe/modules/pose_landmark/pose_landmark_{}.tflite'.format(name)
+    for name in ('lite', 'full', 'heavy')]
+for model in POSE_LANDMARK_MODELS:
+    download_utils.download_oss_model(model)
+MEDIAPIPE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(mediapipe.__file__)))
+
 
 setup(
     name="TrackingApp",
@@ -22,7 +37,13 @@ setup(
     },
     data_files=[
         ('mediapipe/modules/pose_landmark',
-         ['mediapipe/modules/pose_landmark/pose_landmark_cpu.binarypb'])
+         ['mediapipe/modules/pose_landmark/pose_landmark_cpu.binarypb']
+         + [os.path.join(MEDIAPIPE_ROOT, model) for model in POSE_LANDMARK_MODELS]),
+        ('mediapipe/modules/selfie_segmentation',
+         ['mediapipe/modules/selfie_segmentation/selfie_segmentation_cpu.binarypb',
+          'mediapipe/modules/selfie_segmentation/selfie_segmentation_landscape.tflite'])
     ],
-    py_modules=['main', 'interface', 'video_processing', 'controls']
+    py_modules=['main', 'interface', 'video_processing', 'controls'],
+    packages=['common'],
+    package_dir={'common': '../common'}
 )
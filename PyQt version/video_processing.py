@@ -1,323 +1,346 @@
 from PyQt5.QtCore import QThread, pyqtSignal
+import queue
+import threading
+import time
 import numpy as np
-import mediapipe as mp
 import cv2
-
-
-# Initialiser la détection des membres avec Mediapipe
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh()
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands()
-mp_holistic = mp.solutions.holistic
-holistic = mp_holistic.Holistic()
+from common.effects import compile_chain
+from common.governor import QualityGovernor, cap_width
+from common.inference import model_kinds, run_inference
+from common.metrics import metrics
+from common.models import models
+from common.pipeline import BufferPool, LatestQueue, PipelineStage
+from common.recorder import AsyncRecorder
+from common.tracking import KeyframeTracker
+from common.workers import InferencePool
 
 
 class VideoThread(QThread):
-    change_pixmap_signal = pyqtSignal(np.ndarray)
+    # Une image attend l'affichage : la lire avec take_display_frame()
+    frame_ready_signal = pyqtSignal()
     recording_status_signal = pyqtSignal(bool)
+    recording_stats_signal = pyqtSignal(dict)
+    tracking_status_signal = pyqtSignal(bool)
+    # Palier de qualité courant, décrit pour l'interface
+    quality_tier_signal = pyqtSignal(str)
 
-    def __init__(self):
+    def __init__(self, capture_size=None, inference_width=640, inference_workers=0,
+                 target_fps=None):
         super().__init__()
         self._run_flag = True
         self.is_recording = False
         self.selected_effects = []
-        self.deformation_intensity = 1.0
-        self.pointillism_size = 2
-        self.facemask_point_size = 5
-        self.mirror_intensity = 1
-        self.brightness = 0
-        self.contrast = 0
-        self.out = None
+        self.effect_settings = {
+            "deformation_intensity": 1.0,
+            "pointillism_size": 2,
+            "facemask_point_size": 5,
+            "mirror_intensity": 1,
+            "glitch_band_height": 4,
+            "glitch_displacement": 10,
+            "background_blur": 30,
+            "brightness": 0,
+            "contrast": 0,
+        }
+        # Sous target_fps, la qualité baisse par paliers puis remonte quand
+        # la marge revient (None : qualité fixe). Le débit du pipeline est
+        # celui de son étage le plus lent.
+        self.governor = QualityGovernor(target_fps)
+        self._chain_lock = threading.Lock()
+        self.chain = self.compile_chain()
+        self.recorder = None
+        # Au plus une image en attente d'affichage, la plus récente remplace
+        # celle que l'interface n'a pas encore prise. Trois tampons suffisent :
+        # celui affiché, celui en attente et celui en cours de remplissage.
+        self.display_pool = BufferPool(3)
+        # Images rendues : celle en cours de rendu, celle en attente de
+        # sortie et celle en cours d'affichage ou d'enregistrement
+        self.render_pool = BufferPool(3)
+        self._display_frame = None
+        self._display_lock = threading.Lock()
+        self.frame_size = None
+        self.capture_fps = None
+        self._last_capture_time = None
+        self._last_recording_report = 0
         self.cap = cv2.VideoCapture(0)
+        if capture_size:
+            # On peut capturer en HD pour l'enregistrement, l'inférence
+            # travaille sur une copie réduite à inference_width
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, capture_size[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, capture_size[1])
+        self.inference_width = inference_width
         self.drawing = False
         self.draw_color = (0, 255, 0)  # Green color for drawing
         self.draw_thickness = 5
         self.previous_point = None
+        # Inférence complète toutes les N images, points propagés entre deux
+        self.tracker = KeyframeTracker(interval=1, motion_threshold=0)
+        # Avec des workers, les modèles tournent dans d'autres processus et
+        # plusieurs images peuvent être en cours d'inférence à la fois
+        self.inference_pool = None
+        if inference_workers:
+            self.inference_pool = InferencePool(inference_workers,
+                                                inference_width=inference_width)
 
     def run(self):
+        # Capture, inférence et rendu tournent chacun dans leur thread, reliés
+        # par des files d'une place où l'image la plus récente gagne : le débit
+        # est celui de l'étage le plus lent et non la somme des étages
+        stop_event = threading.Event()
+        inference_queue = LatestQueue(maxsize=1, name="inference")
+        render_queue = LatestQueue(maxsize=1, name="render")
+        output_queue = LatestQueue(maxsize=1, name="output",
+                                   on_drop=self.render_pool.release)
+        stages = [
+            PipelineStage("capture", self.capture_stage,
+                          None, inference_queue, stop_event),
+            PipelineStage("inference", self.inference_stage,
+                          inference_queue, render_queue, stop_event),
+            PipelineStage("render", self.render_stage,
+                          render_queue, output_queue, stop_event),
+        ]
+        if self.inference_pool is not None:
+            # Les images sont envoyées aux workers dès leur capture ; la file
+            # suivante ne perd rien, chaque image soumise doit être réclamée
+            # dans l'ordre des séquences par l'étage d'inférence
+            submitted_queue = queue.Queue()
+            stages[1:2] = [
+                PipelineStage("submit", self.submit_stage,
+                              inference_queue, submitted_queue, stop_event),
+                PipelineStage("inference", self.collect_stage,
+                              submitted_queue, render_queue, stop_event),
+            ]
+        for stage in stages:
+            stage.start()
+
+        # L'étage de sortie reste dans ce QThread
         while self._run_flag:
-            ret, frame = self.cap.read()
-            if not ret:
+            try:
+                frame = output_queue.get(timeout=0.1)
+            except queue.Empty:
                 continue
+            self.output_stage(frame)
+
+        stop_event.set()
+        for stage in stages:
+            stage.join()
+
+    def capture_stage(self):
+        with metrics.time("stage", "capture"):
+            ret, frame = self.cap.read()
+        if not ret:
+            time.sleep(0.01)
+            return None
+        self.measure_capture(frame)
+        return frame
 
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = holistic.process(rgb_frame)
-            frame = self.apply_effects(frame, results)
+    def measure_capture(self, frame):
+        # Taille et cadence réelles du flux, utilisées pour l'enregistrement
+        self.frame_size = (frame.shape[1], frame.shape[0])
+        now = time.monotonic()
+        if self._last_capture_time is not None and now > self._last_capture_time:
+            fps = 1.0 / (now - self._last_capture_time)
+            if self.capture_fps is None:
+                self.capture_fps = fps
+            else:
+                self.capture_fps = 0.9 * self.capture_fps + 0.1 * fps
+        self._last_capture_time = now
+
+    def inference_stage(self, frame):
+        start = time.perf_counter()
+        with metrics.time("stage", "inference"):
+            results = self.tracker.process(
+                frame, self.required_landmarks(), self.infer)
+        self.governor.observe("inference", time.perf_counter() - start)
+        self.tracking_status_signal.emit(results.detected)
+        return frame, results
+
+    def submit_stage(self, frame):
+        needs = self.required_landmarks()
+        sequence = None
+        # Entre deux détections, le tracker propage les points : les images
+        # ne sont soumises d'avance que si chacune est une détection
+        if needs and self.tracker.interval <= 1:
+            sequence = self.inference_pool.submit(
+                frame, needs, inference_width=self.capped_inference_width())
+            if sequence is None:
+                # Tous les emplacements sont pris : l'image est perdue
+                metrics.count("dropped_frames", "submit")
+                return None
+        return frame, needs, sequence
+
+    def collect_stage(self, item):
+        frame, needs, sequence = item
+        infer = self.infer
+        # L'attente du résultat des workers compte dans le temps d'inférence :
+        # sans elle, le gouverneur ne verrait jamais l'inférence comme l'étage
+        # le plus lent
+        start = time.perf_counter()
+        with metrics.time("stage", "inference"):
+            if sequence is not None:
+                submitted = self.pool_call(self.inference_pool.result, sequence)
+
+                def infer(frame, needs):
+                    return submitted
+
+            results = self.tracker.process(frame, needs, infer)
+        self.governor.observe("inference", time.perf_counter() - start)
+        self.tracking_status_signal.emit(results.detected)
+        return frame, results
+
+    def render_stage(self, item):
+        frame, results = item
+        start = time.perf_counter()
+        with metrics.time("stage", "render"):
+            # La chaîne écrit dans un tampon du pool au lieu d'allouer une
+            # image ; elle peut aussi rendre l'image reçue, modifiée en place
+            buffer = self.render_pool.acquire(frame.shape, frame.dtype)
+            frame = self.apply_effects(frame, results, out=buffer)
+            if frame is not buffer:
+                self.render_pool.release(buffer)
 
             if self.drawing:
                 self.draw_with_hand(frame, results)
+        self.governor.observe("render", time.perf_counter() - start)
+        return frame
 
-            if self.is_recording and self.out:
-                self.out.write(frame)
+    def output_stage(self, frame):
+        recorder = self.recorder
+        recording = self.is_recording and recorder
+        if recording:
+            # Ne bloque jamais : l'écriture se fait dans le thread du recorder
+            recorder.write(frame)
+            self.report_recording(recorder)
+
+        metrics.tick("output")
+        if self.governor.update():
+            self.apply_quality()
+        self.publish_display(frame)
+        # L'image est recopiée pour l'affichage : son tampon peut resservir au
+        # rendu, sauf si elle a été confiée au recorder qui la garde en file
+        if not recording:
+            self.render_pool.release(frame)
+
+    def publish_display(self, frame):
+        buffer = self.display_pool.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        with self._display_lock:
+            previous, self._display_frame = self._display_frame, buffer
+        if previous is None:
+            # Un seul signal en attente à la fois dans la file de Qt
+            self.frame_ready_signal.emit()
+        else:
+            self.display_pool.release(previous)
+            metrics.count("dropped_frames", "display")
+
+    def take_display_frame(self):
+        with self._display_lock:
+            frame, self._display_frame = self._display_frame, None
+        return frame
 
-            self.change_pixmap_signal.emit(frame)
+    def release_display_frame(self, frame):
+        self.display_pool.release(frame)
+
+    def report_recording(self, recorder):
+        now = time.monotonic()
+        if now - self._last_recording_report >= 1.0:
+            self._last_recording_report = now
+            self.recording_stats_signal.emit(recorder.stats())
+
+    def capped_inference_width(self):
+        # Largeur d'inférence plafonnée par le palier de qualité
+        return cap_width(self.inference_width, self.governor.settings())
+
+    def infer(self, frame, needs):
+        inference_width = self.capped_inference_width()
+        if self.inference_pool is not None:
+            return self.pool_call(self.inference_pool.infer, frame, needs,
+                                  inference_width=inference_width)
+        return run_inference(frame, needs, inference_width=inference_width)
+
+    def pool_call(self, method, *args, **kwargs):
+        # Worker en retard, perdu ou en échec : le tracker propage les points
+        # de la dernière détection (None) au lieu d'arrêter le pipeline
+        try:
+            return method(*args, **kwargs)
+        except (TimeoutError, RuntimeError):
+            metrics.count("inference_failures", "workers")
+            return None
+
+    def apply_quality(self):
+        # Nouveau palier : chaîne recompilée avec ses tailles de noyaux et sa
+        # densité de points. Les workers d'inférence gardent leurs modèles,
+        # seule la résolution change pour eux.
+        self.refresh_chain()
+        if self.inference_pool is None:
+            self.governor.configure_models()
+        self.quality_tier_signal.emit(self.governor.describe())
+
+    def required_landmarks(self):
+        needs = set(self.chain.needs)
+        if self.drawing:
+            needs.add("hands")
+        return needs
+
+    def update_settings(self, **settings):
+        self.effect_settings.update(settings)
+        # La chaîne est recompilée ici et non à chaque image
+        self.refresh_chain()
+
+    def set_selected_effects(self, selected_effects):
+        self.selected_effects = selected_effects
+        self.refresh_chain()
+        # Charger les modèles en arrière-plan dès la sélection, pour que
+        # l'activation d'un effet ne fige pas l'image. Les workers, eux,
+        # construisent leurs graphes à leur première image.
+        if self.inference_pool is None:
+            models.warm_up(model_kinds(self.required_landmarks()))
 
     def stop(self):
         self._run_flag = False
-        self.cap.release()
-        if self.out:
-            self.out.release()
         self.quit()
+        # On attend la fin des étages avant de libérer la caméra
         self.wait()
+        self.cap.release()
+        if self.inference_pool is not None:
+            self.inference_pool.close()
+        if self.recorder:
+            self.recorder.close(wait=True)
+
+    def recording_geometry(self):
+        frame_size = self.frame_size or (
+            int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640,
+            int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480)
+        # Beaucoup de webcams annoncent une cadence fausse : on préfère celle
+        # mesurée à la capture
+        fps = self.capture_fps or self.cap.get(cv2.CAP_PROP_FPS) or 20.0
+        return frame_size, round(fps, 2)
 
     def start_recording(self, filename):
+        if self.recorder:
+            self.recorder.close()
+        frame_size, fps = self.recording_geometry()
+        self.recorder = AsyncRecorder(filename, fps, frame_size)
         self.is_recording = True
-        self.out = cv2.VideoWriter(
-            filename, cv2.VideoWriter_fourcc(*'XVID'), 20.0, (640, 480))
         self.recording_status_signal.emit(True)
 
     def stop_recording(self):
         self.is_recording = False
-        if self.out:
-            self.out.release()
-            self.out = None
+        if self.recorder:
+            # Le recorder finit d'écrire sa file en arrière-plan
+            self.recorder.close()
+            self.recorder = None
         self.recording_status_signal.emit(False)
 
-    def apply_effects(self, frame, results):
-        for effect in self.selected_effects:
-            if effect == "Deformation":
-                frame = self.apply_deformation(frame, results.pose_landmarks)
-            elif effect == "Mirror":
-                frame = self.apply_mirror_effect(frame, results.pose_landmarks)
-            elif effect == "Color Change":
-                frame = self.change_color(frame, results.pose_landmarks)
-            elif effect == "Fun Filters":
-                frame = self.add_fun_filters(frame, results.pose_landmarks)
-            elif effect == "Bubble":
-                frame = self.add_bubble_effect(frame, results.pose_landmarks)
-            elif effect == "Wave":
-                frame = self.add_wave_effect(frame, results.pose_landmarks)
-            elif effect == "Pointillism":
-                frame = self.apply_pointillism_effect(
-                    frame, results.pose_landmarks)
-            elif effect == "Face Morphing" and results.face_landmarks:
-                frame = self.apply_face_morphing(frame, results.face_landmarks)
-            elif effect == "Rainbow":
-                frame = self.apply_rainbow_effect(frame)
-            elif effect == "Glitch":
-                frame = self.apply_glitch_effect(frame)
-            elif effect == "Hand Tracking" and (results.left_hand_landmarks or results.right_hand_landmarks):
-                frame = self.apply_hand_tracking_effect(frame, results)
-            elif effect == "Background Distortion":
-                frame = self.apply_background_distortion(
-                    frame, results.pose_landmarks)
-            elif effect == "Face Mask" and results.face_landmarks:
-                frame = self.apply_face_mask(frame, results.face_landmarks)
-        frame = self.adjust_brightness_contrast(frame)
-        return frame
-
-    def apply_deformation(self, frame, landmarks):
-        if landmarks:
-            for idx in [mp_pose.PoseLandmark.LEFT_EYE.value, mp_pose.PoseLandmark.RIGHT_EYE.value, mp_pose.PoseLandmark.LEFT_WRIST.value, mp_pose.PoseLandmark.RIGHT_WRIST.value]:
-                point = landmarks.landmark[idx]
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                size = int(30 * self.deformation_intensity)
-
-                src_points = np.float32(
-                    [[x - size, y - size], [x + size, y - size], [x + size, y + size], [x - size, y + size]])
-                dst_points = np.float32([[x - size, y - int(size * 1.5)], [x + size, y - int(
-                    size * 1.5)], [x + size, y + int(size * 1.5)], [x - size, y + int(size * 1.5)]])
-                warped = self.warp_image(frame, src_points, dst_points)
-                mask = np.zeros_like(frame)
-                cv2.fillConvexPoly(
-                    mask, src_points.astype(int), (255, 255, 255))
-                frame = cv2.bitwise_and(frame, cv2.bitwise_not(mask))
-                frame = cv2.add(frame, cv2.bitwise_and(warped, mask))
-        return frame
-
-    def warp_image(self, frame, src_points, dst_points):
-        matrix = cv2.getPerspectiveTransform(src_points, dst_points)
-        warped = cv2.warpPerspective(
-            frame, matrix, (frame.shape[1], frame.shape[0]))
-        return warped
-
-    def apply_mirror_effect(self, frame, landmarks):
-        if landmarks:
-            for idx in [mp_pose.PoseLandmark.NOSE.value, mp_pose.PoseLandmark.MOUTH_LEFT.value, mp_pose.PoseLandmark.MOUTH_RIGHT.value]:
-                point = landmarks.landmark[idx]
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                size = 100 * self.mirror_intensity  # Augmenter l'intensité de l'effet miroir
-
-                left = max(x - size, 0)
-                right = min(x + size, frame.shape[1])
-                top = max(y - size, 0)
-                bottom = min(y + size, frame.shape[0])
-
-                if left < right and top < bottom:
-                    frame[top:bottom, left:right] = cv2.flip(
-                        frame[top:bottom, left:right], 1)
-
-        return frame
-
-    def change_color(self, frame, landmarks):
-        if landmarks:
-            for idx in [mp_pose.PoseLandmark.LEFT_WRIST.value, mp_pose.PoseLandmark.RIGHT_WRIST.value]:
-                point = landmarks.landmark[idx]
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                size = 30
-
-                left = max(x - size, 0)
-                right = min(x + size, frame.shape[1])
-                top = max(y - size, 0)
-                bottom = min(y + size, frame.shape[0])
-
-                if left < right and top < bottom:
-                    frame[top:bottom, left:right] = cv2.applyColorMap(
-                        frame[top:bottom, left:right], cv2.COLORMAP_JET)
-
-        return frame
-
-    def add_fun_filters(self, frame, landmarks):
-        if landmarks:
-            nose = landmarks.landmark[mp_pose.PoseLandmark.NOSE.value]
-            left_eye = landmarks.landmark[mp_pose.PoseLandmark.LEFT_EYE.value]
-            right_eye = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_EYE.value]
-            mouth_left = landmarks.landmark[mp_pose.PoseLandmark.MOUTH_LEFT.value]
-            mouth_right = landmarks.landmark[mp_pose.PoseLandmark.MOUTH_RIGHT.value]
-
-            _ = int(nose.x * frame.shape[1])
-            _ = int(nose.y * frame.shape[0])
-            left_eye_x = int(left_eye.x * frame.shape[1])
-            left_eye_y = int(left_eye.y * frame.shape[0])
-            right_eye_x = int(right_eye.x * frame.shape[1])
-            right_eye_y = int(right_eye.y * frame.shape[0])
-            mouth_left_x = int(mouth_left.x * frame.shape[1])
-            mouth_left_y = int(mouth_left.y * frame.shape[0])
-            mouth_right_x = int(mouth_right.x * frame.shape[1])
-            mouth_right_y = int(mouth_right.y * frame.shape[0])
-
-            cv2.line(frame, (left_eye_x - 20, left_eye_y),
-                    (right_eye_x + 20, right_eye_y), (0, 0, 0), 5)
-            cv2.circle(frame, (left_eye_x, left_eye_y), 30, (0, 0, 0), 5)
-            cv2.circle(frame, (right_eye_x, right_eye_y), 30, (0, 0, 0), 5)
-
-            cv2.line(frame, (mouth_left_x, mouth_left_y + 10),
-                    (mouth_right_x, mouth_right_y + 10), (0, 0, 0), 10)
-            cv2.line(frame, (mouth_left_x - 10, mouth_left_y + 20),
-                    (mouth_right_x + 10, mouth_right_y + 20), (0, 0, 0), 10)
-
-        return frame
-
-    def add_bubble_effect(self, frame, landmarks):
-        if landmarks:
-            for idx in [mp_pose.PoseLandmark.LEFT_EYE.value, mp_pose.PoseLandmark.RIGHT_EYE.value, mp_pose.PoseLandmark.NOSE.value, mp_pose.PoseLandmark.MOUTH_LEFT.value, mp_pose.PoseLandmark.MOUTH_RIGHT.value]:
-                point = landmarks.landmark[idx]
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                radius = 30
-
-                cv2.circle(frame, (x, y), radius, (255, 255, 255), 3)
-
-        return frame
-
-    def add_wave_effect(self, frame, landmarks):
-        if landmarks:
-            for idx in [mp_pose.PoseLandmark.LEFT_WRIST.value, mp_pose.PoseLandmark.RIGHT_WRIST.value, mp_pose.PoseLandmark.LEFT_KNEE.value, mp_pose.PoseLandmark.RIGHT_KNEE.value]:
-                point = landmarks.landmark[idx]
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                size = 30
-
-                rng = np.random.default_rng(seed=42)
-                for i in rng.integers(1, 6, size=5):
-                    cv2.circle(frame, (x, y), size + i * 5, (0, 255, 255), 2)
-
-        return frame
-
-    def apply_pointillism_effect(self, frame, landmarks):
-        if landmarks:
-            output = np.zeros_like(frame)
-            height, width, _ = frame.shape
-            for idx in range(len(landmarks.landmark)):
-                point = landmarks.landmark[idx]
-                x = int(point.x * width)
-                y = int(point.y * height)
-                if 0 <= x < width and 0 <= y < height:
-                    color = frame[y, x]
-                    cv2.circle(output, (x, y), self.pointillism_size,
-                            color.tolist(), -1)
-            return output
-        return frame
-
-    def apply_face_morphing(self, frame, face_landmarks):
-        if face_landmarks:
-            for point in face_landmarks.landmark:
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                frame[y:y+3, x:x+3] = (0, 255, 0)
-        return frame
-
-    def apply_rainbow_effect(self, frame):
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        hsv[..., 0] = (hsv[..., 0] + 10) % 180
-        frame = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-        return frame
-
-    def apply_glitch_effect(self, frame):
-        height, width, _ = frame.shape
-        glitch_frame = np.copy(frame)
-        for i in range(0, height, 4):
-            glitch_frame[i:i+4, :] = np.roll(frame[i:i+4, :],
-                                            np.random.randint(-10, 10), axis=1)
-        return glitch_frame
-
-    def apply_hand_tracking_effect(self, frame, results):
-        if results.left_hand_landmarks:
-            frame = self.draw_hand_landmarks(
-                frame, results.left_hand_landmarks)
-        if results.right_hand_landmarks:
-            frame = self.draw_hand_landmarks(
-                frame, results.right_hand_landmarks)
-        return frame
-
-    def draw_hand_landmarks(self, frame, hand_landmarks):
-        for point in hand_landmarks.landmark:
-            x = int(point.x * frame.shape[1])
-            y = int(point.y * frame.shape[0])
-            cv2.circle(frame, (x, y), 5, (0, 255, 0), -1)
-        return frame
-
-    def apply_background_distortion(self, frame, landmarks):
-        if landmarks:
-            mask = np.zeros(frame.shape[:2], dtype=np.uint8)
-            for idx in range(len(landmarks.landmark)):
-                point = landmarks.landmark[idx]
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                cv2.circle(mask, (x, y), 15, 255, -1)
-            dist_frame = cv2.GaussianBlur(frame, (99, 99), 30)
-            frame = np.where(mask[..., None] == 255, frame, dist_frame)
-        return frame
+    def compile_chain(self):
+        # Luminosité et contraste sont toujours appliqués en dernier
+        return compile_chain(self.selected_effects + ["Brightness/Contrast"],
+                             self.governor.apply(self.effect_settings))
 
-    def apply_face_mask(self, frame, face_landmarks):
-        if face_landmarks:
-            for point in face_landmarks.landmark:
-                x = int(point.x * frame.shape[1])
-                y = int(point.y * frame.shape[0])
-                cv2.circle(frame, (x, y), self.facemask_point_size,
-                           (255, 0, 0), -1)
-        return frame
-
-    def adjust_brightness_contrast(self, frame):
-        brightness = self.brightness
-        contrast = self.contrast
-        if brightness != 0:
-            shadow = brightness if brightness > 0 else 0
-            highlight = 255 if brightness > 0 else 255 + brightness
-            alpha_b = (highlight - shadow) / 255
-            gamma_b = shadow
-            frame = cv2.addWeighted(frame, alpha_b, frame, 0, gamma_b)
-
-        if contrast != 0:
-            f = 131 * (contrast + 127) / (127 * (131 - contrast))
-            alpha_c = f
-            gamma_c = 127 * (1 - f)
-            frame = cv2.addWeighted(frame, alpha_c, frame, 0, gamma_c)
+    def refresh_chain(self):
+        # L'interface et le gouverneur recompilent depuis des threads
+        # différents : la dernière chaîne publiée lit les derniers réglages
+        with self._chain_lock:
+            self.chain = self.compile_chain()
 
-        return frame
+    def apply_effects(self, frame, results, out=None):
+        return self.chain(frame, results, out=out)
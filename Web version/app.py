@@ -1,10 +1,24 @@
+import os
+import sys
+
+# Le dossier parent contient le paquet common partagé avec la version PyQt
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
 from flask import Flask, render_template, Response, request, jsonify
-import cv2
-import numpy as np
-import mediapipe as mp
-import warnings
 import threading
-from video_processing import apply_effects, update_effect_settings
+import time
+import warnings
+import cv2
+from video_processing import SettingsStore, validate_settings
+from broadcaster import FrameBroadcaster
+from common.engine import MultiSourceEngine, Source
+from common.governor import QualityGovernor
+from common.inference import model_kinds, run_inference
+from common.metrics import metrics
+from common.models import models
+from common.pipeline import BufferPool
+from common.tracking import KeyframeTracker
+from common.workers import InferencePool
 
 # Ignorer les avertissements spécifiques de protobuf
 warnings.filterwarnings("ignore", category=UserWarning,
@@ -12,13 +26,7 @@ warnings.filterwarnings("ignore", category=UserWarning,
 
 app = Flask(__name__)
 
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh()
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands()
-
+# Réglages de départ ; les mises à jour passent par settings_store
 effect_settings = {
     "deformation_intensity": 1,
     "pointillism_size": 2,
@@ -27,33 +35,137 @@ effect_settings = {
     "color_intensity": 5,
     "blur_intensity": 1,
     "vignette_intensity": 1,
+    "glitch_band_height": 4,
+    "glitch_displacement": 10,
+    "background_blur": 30,
+    "keyframe_interval": 1,
+    "motion_threshold": 0,
+    "inference_width": 640,
     "selected_effects": []
 }
 
-lock = threading.Lock()
+# Instantanés versionnés des réglages, avec leur chaîne d'effets compilée
+settings_store = SettingsStore(effect_settings)
+
+# Inférence complète toutes les N images, points propagés entre deux
+tracker = KeyframeTracker()
+
+# Images rendues, rendues au pool par le broadcaster une fois encodées
+render_pool = BufferPool(2)
+
+# Processus d'inférence séparés : Pose, FaceMesh et Hands tournent en
+# parallèle au lieu de l'un après l'autre (0 : dans ce processus). Les
+# workers ne démarrent qu'à la première image.
+INFERENCE_WORKERS = 0
+inference_pool = InferencePool(INFERENCE_WORKERS) if INFERENCE_WORKERS else None
+
+# Cadence visée, par ex. 24 : sous cette cadence, la qualité baisse par
+# paliers (résolution d'inférence, complexité des modèles, noyaux de flou,
+# densité des points) puis remonte quand la marge revient. None : qualité
+# fixe, les réglages ne sont jamais modifiés.
+TARGET_FPS = None
+# Inférence puis rendu dans le même thread : le temps par image est leur somme
+governor = QualityGovernor(TARGET_FPS, pipelined=False)
+
+
+def process_frame(frame):
+    # Un seul instantané par image, lu sans verrou : une mise à jour publiée
+    # pendant le rendu ne s'applique qu'à l'image suivante
+    snapshot = settings_store.current
+    settings = snapshot.effective
+    tracker.interval = settings["keyframe_interval"]
+    tracker.motion_threshold = settings["motion_threshold"]
+
+    def infer(frame, needs):
+        # Les modèles travaillent sur une copie réduite, les effets sur l'image pleine
+        if inference_pool is not None:
+            return inference_pool.infer(frame, needs,
+                                        inference_width=settings["inference_width"])
+        return run_inference(frame, needs, use_holistic=False,
+                             inference_width=settings["inference_width"])
+
+    # On ne lance que les modèles utilisés par les effets actifs
+    start = time.perf_counter()
+    with metrics.time("stage", "inference"):
+        results = tracker.process(frame, snapshot.chain.needs, infer)
+    rendered = time.perf_counter()
+    governor.observe("inference", rendered - start)
+
+    buffer = render_pool.acquire(frame.shape, frame.dtype)
+    with metrics.time("stage", "render"):
+        frame = snapshot.chain(frame, results, out=buffer)
+    governor.observe("render", time.perf_counter() - rendered)
+    if frame is not buffer:
+        render_pool.release(buffer)
+
+    if governor.update():
+        # Nouveau palier, appliqué à partir de l'image suivante. Les workers
+        # d'inférence gardent leurs modèles : seule la résolution change.
+        settings_store.set_tier(governor.settings())
+        if inference_pool is None:
+            governor.configure_models()
+    return frame
+
+
+# Mesures par étage, par effet et par modèle, exposées sur /metrics
+METRICS_ENABLED = True
+metrics.enabled = METRICS_ENABLED
+
+# Résolution de capture demandée à la caméra, par ex. (1920, 1080) ;
+# None garde celle par défaut
+CAPTURE_SIZE = None
+
+# Une seule capture et une seule inférence, partagées par tous les clients
+broadcaster = FrameBroadcaster(process_frame, source=0, capture_size=CAPTURE_SIZE,
+                               release_frame=render_pool.release)
+
+
+# Plusieurs caméras ou fichiers traités ensemble (voir common.engine), par ex.
+# [1, 2, "rtsp://camera/flux"] : chacune a son flux /source_feed/<n>, la
+# grille de toutes les sources est sur /grid_feed. Le moteur partage les
+# workers d'inférence ci-dessus et ne démarre qu'au premier client.
+ENGINE_SOURCES = []
+engine = None
+if ENGINE_SOURCES:
+    engine = MultiSourceEngine(
+        [Source(uri, name="source{}".format(index), settings=effect_settings,
+                loop=True, capture_size=CAPTURE_SIZE)
+         for index, uri in enumerate(ENGINE_SOURCES)],
+        inference_pool=inference_pool, grid=True)
+engine_lock = threading.Lock()
+engine_started = False
+
+
+def engine_frames(name):
+    global engine_started
+    with engine_lock:
+        if not engine_started:
+            engine.start()
+            engine_started = True
+    subscriber = engine.subscribe(name)
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
+    try:
+        while True:
+            ret, buffer = cv2.imencode('.jpg', subscriber.get(), encode_params)
+            if ret:
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+    finally:
+        engine.unsubscribe(name, subscriber)
 
 
 def generate_frames():
-    cap = cv2.VideoCapture(0)
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-        else:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results_pose = pose.process(rgb_frame)
-            results_face = face_mesh.process(rgb_frame)
-            results_hands = hands.process(rgb_frame)
-
-            with lock:
-                frame = apply_effects(
-                    frame, results_pose, results_face, results_hands, effect_settings)
-
+    subscriber = broadcaster.subscribe()
+    try:
+        while True:
+            frame = subscriber.get()
+            if frame is None:
+                break
             # Utiliser JPEG pour le flux vidéo
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    finally:
+        subscriber.close()
 
 
 @app.route('/')
@@ -66,13 +178,72 @@ def video_feed():
     return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+def apply_effect_update(data):
+    # Partagé avec le serveur ASGI (asgi.py). data ne contient que les
+    # réglages modifiés ; ValueError si un réglage est invalide.
+    snapshot = settings_store.update(data)
+    # Charger en arrière-plan les modèles des effets qui viennent d'être activés
+    if inference_pool is None:
+        models.warm_up(model_kinds(snapshot.chain.needs, use_holistic=False))
+    return snapshot
+
+
 @app.route('/update_effects', methods=['POST'])
 def update_effects_route():
-    data = request.json
-    with lock:
-        update_effect_settings(effect_settings, data)
+    try:
+        snapshot = apply_effect_update(request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify(success=False, error=str(error)), 400
+    return jsonify(success=True, version=snapshot.version)
+
+
+@app.route('/sources')
+def sources_route():
+    if engine is None:
+        return jsonify(sources={})
+    return jsonify(sources=engine.stats())
+
+
+@app.route('/source_feed/<int:index>')
+def source_feed(index):
+    if engine is None or not 0 <= index < len(engine.sources):
+        return jsonify(success=False, error="Source inconnue"), 404
+    return Response(engine_frames(engine.sources[index].name),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+@app.route('/grid_feed')
+def grid_feed():
+    if engine is None:
+        return jsonify(success=False, error="Aucune source configurée"), 404
+    return Response(engine_frames("grid"), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+@app.route('/sources/<int:index>/update_effects', methods=['POST'])
+def update_source_effects(index):
+    # Réglages propres à une source, même forme que /update_effects
+    if engine is None or not 0 <= index < len(engine.sources):
+        return jsonify(success=False, error="Source inconnue"), 404
+    source = engine.sources[index]
+    try:
+        settings = validate_settings(source.settings, request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify(success=False, error=str(error)), 400
+    source.update_settings(**settings)
     return jsonify(success=True)
 
 
+@app.route('/stats')
+def stats_route():
+    return jsonify(tracking=tracker.stats(), quality=governor.stats())
+
+
+@app.route('/metrics')
+def metrics_route():
+    # Format texte de Prometheus
+    return Response(metrics.prometheus() + governor.prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     app.run(debug=True)
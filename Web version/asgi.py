@@ -0,0 +1,210 @@
+import asyncio
+import os
+
+from flask import render_template
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.staticfiles import StaticFiles
+from starlette.websockets import WebSocketDisconnect
+
+# Importer app installe aussi le chemin du paquet common
+from app import app as flask_app, apply_effect_update, broadcaster, governor, tracker
+from common.metrics import metrics
+
+# Serveur asyncio pour de nombreux clients, avec les mêmes routes que la
+# version Flask plus un WebSocket (/ws) :
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+# Un client, même lent ou inactif, ne coûte qu'une tâche asyncio et non un
+# thread. Capture, inférence et encodage restent dans le thread du
+# broadcaster ; la boucle ne fait que relayer les JPEG déjà prêts.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class AsyncFrameHub:
+    # Abonné unique du broadcaster pour tous les clients asyncio : une seule
+    # notification par image, quel que soit le nombre de clients. Chaque
+    # client envoie l'image la plus récente dès qu'il a fini la précédente,
+    # un client lent saute donc des images sans retarder les autres.
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.payload = None
+        self.sequence = 0
+        self.clients = 0
+        self.subscribed = False
+        self._loop = None
+        self._changed = asyncio.Event()
+        # Abonnement et désabonnement passent par des tâches, l'une après
+        # l'autre : un client qui part pendant l'abonnement ne les
+        # interrompt pas, et l'état final suit toujours le nombre de clients
+        self._sync_lock = asyncio.Lock()
+        self._tasks = set()
+
+    # Appelé depuis le thread du broadcaster
+    def put(self, payload):
+        try:
+            self._loop.call_soon_threadsafe(self._publish, payload)
+        except RuntimeError:
+            # Boucle déjà fermée (arrêt du serveur)
+            pass
+
+    def _publish(self, payload):
+        self.payload = payload
+        self.sequence += 1
+        # Réveille tous les clients en attente, les suivants attendront
+        # l'événement neuf
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def join(self):
+        # À appeler dans le try dont le finally appelle leave(). Renvoie la
+        # séquence vue avant l'abonnement : une image (ou la fin du flux)
+        # publiée pendant l'abonnement n'est pas manquée.
+        self._loop = asyncio.get_running_loop()
+        self.clients += 1
+        seen = self.sequence
+        # Le premier client démarre la caméra (ou attend que le producteur
+        # précédent la rende) ; la tâche va au bout même si ce client part
+        await asyncio.shield(self._schedule_sync())
+        return seen
+
+    def leave(self):
+        self.clients -= 1
+        # Plus de client asyncio : on libère la caméra s'il n'y a pas non
+        # plus de client Flask
+        self._schedule_sync()
+
+    def _schedule_sync(self):
+        task = self._loop.create_task(self._sync())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _sync(self):
+        # Les appels au broadcaster prennent son verrou et peuvent attendre
+        # l'arrêt de son thread : ils se font hors de la boucle
+        async with self._sync_lock:
+            while (self.clients > 0) != self.subscribed:
+                if self.subscribed:
+                    await run_in_threadpool(self.broadcaster.unsubscribe, self)
+                    self.subscribed = False
+                else:
+                    await run_in_threadpool(self.broadcaster.add_subscriber, self)
+                    self.subscribed = True
+
+    async def wait_frame(self, seen):
+        # Image plus récente que seen : (sequence, JPEG), JPEG None en fin de flux
+        while self.sequence == seen:
+            await self._changed.wait()
+        return self.sequence, self.payload
+
+
+hub = AsyncFrameHub(broadcaster)
+
+# La page est celle de la version Flask, rendue une fois avec ses URL
+with flask_app.test_request_context():
+    INDEX_HTML = render_template("index.html")
+
+
+async def index(request):
+    return HTMLResponse(INDEX_HTML)
+
+
+async def generate_frames():
+    try:
+        seen = await hub.join()
+        while True:
+            seen, frame = await hub.wait_frame(seen)
+            if frame is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    finally:
+        hub.leave()
+
+
+async def video_feed(request):
+    # Flux MJPEG, pour les clients sans WebSocket
+    return StreamingResponse(generate_frames(),
+                             media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+async def update_effects(request):
+    try:
+        data = await request.json()
+        # La recompilation de la chaîne se fait hors de la boucle
+        snapshot = await run_in_threadpool(apply_effect_update, data)
+    except ValueError as error:
+        return JSONResponse({"success": False, "error": str(error)}, status_code=400)
+    return JSONResponse({"success": True, "version": snapshot.version})
+
+
+async def stats(request):
+    return JSONResponse({"tracking": tracker.stats(), "quality": governor.stats()})
+
+
+async def metrics_route(request):
+    return Response(metrics.prometheus() + governor.prometheus(),
+                    media_type='text/plain; version=0.0.4')
+
+
+async def websocket_feed(websocket):
+    # Images JPEG en messages binaires ; le client envoie ses réglages
+    # modifiés en JSON (même forme que /update_effects) et reçoit la même
+    # réponse que cette route
+    await websocket.accept()
+    sender = None
+    try:
+        seen = await hub.join()
+        # Images et réponses sont envoyées par deux tâches
+        send_lock = asyncio.Lock()
+        sender = asyncio.create_task(send_frames(websocket, send_lock, seen))
+        while True:
+            data = await websocket.receive_json()
+            try:
+                snapshot = await run_in_threadpool(apply_effect_update, data)
+                reply = {"success": True, "version": snapshot.version}
+            except ValueError as error:
+                reply = {"success": False, "error": str(error)}
+            async with send_lock:
+                await websocket.send_json(reply)
+    except (WebSocketDisconnect, RuntimeError, ValueError):
+        # Client parti, connexion fermée en fin de flux ou JSON illisible
+        pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+        hub.leave()
+
+
+async def send_frames(websocket, send_lock, seen):
+    try:
+        while True:
+            seen, frame = await hub.wait_frame(seen)
+            if frame is None:
+                break
+            async with send_lock:
+                await websocket.send_bytes(frame)
+        await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        # Client parti pendant un envoi
+        pass
+
+
+app = Starlette(routes=[
+    Route('/', index),
+    Route('/video_feed', video_feed),
+    Route('/update_effects', update_effects, methods=['POST']),
+    Route('/stats', stats),
+    Route('/metrics', metrics_route),
+    WebSocketRoute('/ws', websocket_feed),
+    Mount('/static', StaticFiles(directory=os.path.join(HERE, 'static')), name='static'),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='127.0.0.1', port=5000)
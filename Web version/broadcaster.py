@@ -0,0 +1,103 @@
+import threading
+
+import cv2
+
+from common.metrics import metrics
+from common.pipeline import LatestQueue
+
+
+class FrameSubscriber(LatestQueue):
+    # Si le client est en retard, on jette l'image la plus ancienne
+    # pour ne jamais bloquer le producteur ni les autres clients
+    def __init__(self, broadcaster, maxsize):
+        super().__init__(maxsize, name="subscriber")
+        self.broadcaster = broadcaster
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+# Un seul thread possède la caméra et l'inférence, les images JPEG
+# terminées sont diffusées à tous les abonnés. release_frame reçoit l'image
+# rendue une fois encodée, pour que son tampon resserve à l'image suivante.
+class FrameBroadcaster:
+    def __init__(self, process_frame, source=0, queue_size=2, jpeg_quality=95,
+                 capture_size=None, release_frame=None):
+        self.process_frame = process_frame
+        self.release_frame = release_frame
+        self.source = source
+        self.capture_size = capture_size
+        self.queue_size = queue_size
+        self.jpeg_quality = jpeg_quality
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        return self.add_subscriber(FrameSubscriber(self, self.queue_size))
+
+    def add_subscriber(self, subscriber):
+        # subscriber.put(payload) est appelé depuis le thread du broadcaster,
+        # puis put(None) en fin de flux ; il ne doit jamais bloquer
+        with self._lock:
+            self._ensure_running()
+            self._subscribers = self._subscribers + (subscriber,)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = tuple(
+                s for s in self._subscribers if s is not subscriber)
+            if not self._subscribers:
+                # Plus personne ne regarde : on libère la caméra
+                self._stop_event.set()
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            if not self._stop_event.is_set():
+                return
+            # Le producteur précédent est en train de s'arrêter, on attend
+            # qu'il rende la caméra avant d'en ouvrir une nouvelle
+            self._thread.join()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.source)
+        if self.capture_size:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.capture_size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.capture_size[1])
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        # L'image capturée n'est plus utilisée une fois encodée : la caméra
+        # écrit la suivante dans le même tableau
+        captured = None
+        try:
+            while not self._stop_event.is_set():
+                with metrics.time("stage", "capture"):
+                    success, captured = cap.read(captured)
+                if not success:
+                    break
+                frame = self.process_frame(captured)
+                with metrics.time("stage", "encode"):
+                    ret, buffer = cv2.imencode('.jpg', frame, encode_params)
+                if self.release_frame is not None and frame is not captured:
+                    self.release_frame(frame)
+                if not ret:
+                    continue
+                metrics.tick("output")
+                payload = buffer.tobytes()
+                # Le tuple est remplacé (jamais modifié), pas besoin du verrou
+                for subscriber in self._subscribers:
+                    subscriber.put(payload)
+        finally:
+            cap.release()
+            # Fin du flux : on réveille les clients pour qu'ils se terminent
+            for subscriber in self._subscribers:
+                subscriber.put(None)
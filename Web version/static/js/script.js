@@ -3,6 +3,7 @@ document.addEventListener("DOMContentLoaded", () => {
   const mirrorCheckbox = document.getElementById("mirror");
   const pointillismCheckbox = document.getElementById("pointillism");
   const facemaskCheckbox = document.getElementById("facemask");
+  const handTrackingCheckbox = document.getElementById("handTracking");
   const colorFilterCheckbox = document.getElementById("colorFilter");
   const blurCheckbox = document.getElementById("blur");
   const vignetteCheckbox = document.getElementById("vignette");
@@ -16,49 +17,135 @@ document.addEventListener("DOMContentLoaded", () => {
   const colorIntensitySlider = document.getElementById("colorIntensity");
   const blurSlider = document.getElementById("blurIntensity");
   const vignetteSlider = document.getElementById("vignetteIntensity");
+  const keyframeIntervalSlider = document.getElementById("keyframeInterval");
+  const motionThresholdSlider = document.getElementById("motionThreshold");
 
   const applyEffectsButton = document.getElementById("applyEffects");
+  const videoFeed = document.getElementById("videoFeed");
+  const mjpegUrl = videoFeed.src;
 
-  applyEffectsButton.addEventListener("click", () => {
-    const selectedEffects = [];
-    if (deformationCheckbox.checked) selectedEffects.push("Deformation");
-    if (mirrorCheckbox.checked) selectedEffects.push("Mirror");
-    if (pointillismCheckbox.checked) selectedEffects.push("Pointillism");
-    if (facemaskCheckbox.checked) selectedEffects.push("Face Mask");
-    if (colorFilterCheckbox.checked) selectedEffects.push("Color Filter");
-    if (blurCheckbox.checked) selectedEffects.push("Blur");
-    if (vignetteCheckbox.checked) selectedEffects.push("Vignette");
-    if (sepiaCheckbox.checked) selectedEffects.push("Sepia");
-    if (cartoonCheckbox.checked) selectedEffects.push("Cartoon");
+  // Avec le serveur ASGI, images et réglages passent par un WebSocket. Sans
+  // lui (serveur Flask), la connexion échoue et on garde le flux MJPEG.
+  let socket = null;
+  let frameUrl = null;
+  const protocol = location.protocol === "https:" ? "wss:" : "ws:";
+  const ws = new WebSocket(`${protocol}//${location.host}/ws`);
+  ws.binaryType = "blob";
+  ws.addEventListener("open", () => {
+    socket = ws;
+  });
+  ws.addEventListener("message", (event) => {
+    if (typeof event.data === "string") {
+      logUpdate(JSON.parse(event.data));
+      return;
+    }
+    // Afficher l'image remplace aussi le flux MJPEG, qui est alors fermé
+    const url = URL.createObjectURL(event.data);
+    videoFeed.src = url;
+    if (frameUrl) URL.revokeObjectURL(frameUrl);
+    frameUrl = url;
+  });
+  ws.addEventListener("close", () => {
+    if (socket === ws) {
+      socket = null;
+      videoFeed.src = mjpegUrl;
+    }
+  });
+
+  const effectCheckboxes = [
+    [deformationCheckbox, "Deformation"],
+    [mirrorCheckbox, "Mirror"],
+    [pointillismCheckbox, "Pointillism"],
+    [facemaskCheckbox, "Face Mask"],
+    [handTrackingCheckbox, "Hand Tracking"],
+    [colorFilterCheckbox, "Color Filter"],
+    [blurCheckbox, "Blur"],
+    [vignetteCheckbox, "Vignette"],
+    [sepiaCheckbox, "Sepia"],
+    [cartoonCheckbox, "Cartoon"],
+  ];
+  const settingSliders = [
+    [deformationSlider, "deformation_intensity"],
+    [pointillismSlider, "pointillism_size"],
+    [facemaskSlider, "facemask_point_size"],
+    [mirrorSlider, "mirror_intensity"],
+    [colorIntensitySlider, "color_intensity"],
+    [blurSlider, "blur_intensity"],
+    [vignetteSlider, "vignette_intensity"],
+    [keyframeIntervalSlider, "keyframe_interval"],
+    [motionThresholdSlider, "motion_threshold"],
+  ];
+
+  // Seuls les réglages modifiés sont envoyés, regroupés : pendant qu'on fait
+  // glisser un curseur, une seule mise à jour part après DEBOUNCE_MS sans
+  // mouvement, et jamais plus d'une requête à la fois.
+  const DEBOUNCE_MS = 150;
+  const pending = {};
+  let debounceTimer = null;
+  let inFlight = false;
+
+  function selectedEffects() {
+    return effectCheckboxes
+      .filter(([checkbox]) => checkbox.checked)
+      .map(([, name]) => name);
+  }
+
+  function queueUpdate(key, value) {
+    pending[key] = value;
+    clearTimeout(debounceTimer);
+    debounceTimer = setTimeout(flushUpdates, DEBOUNCE_MS);
+  }
 
-    const effects = {
-      deformation_intensity: parseInt(deformationSlider.value),
-      pointillism_size: parseInt(pointillismSlider.value),
-      facemask_point_size: parseInt(facemaskSlider.value),
-      mirror_intensity: parseInt(mirrorSlider.value),
-      color_intensity: parseInt(colorIntensitySlider.value),
-      blur_intensity: parseInt(blurSlider.value),
-      vignette_intensity: parseInt(vignetteSlider.value),
-      selected_effects: selectedEffects,
-    };
+  function logUpdate(data) {
+    if (data.success) {
+      console.log(`Effects updated successfully (version ${data.version})`);
+    } else {
+      console.log("Failed to update effects:", data.error);
+    }
+  }
 
+  function flushUpdates() {
+    clearTimeout(debounceTimer);
+    if (inFlight || Object.keys(pending).length === 0) return;
+    const delta = Object.assign({}, pending);
+    for (const key of Object.keys(delta)) delete pending[key];
+
+    if (socket) {
+      socket.send(JSON.stringify(delta));
+      return;
+    }
+
+    inFlight = true;
     fetch("/update_effects", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
       },
-      body: JSON.stringify(effects),
+      body: JSON.stringify(delta),
     })
       .then((response) => response.json())
-      .then((data) => {
-        if (data.success) {
-          console.log("Effects updated successfully");
-        } else {
-          console.log("Failed to update effects");
-        }
-      })
+      .then(logUpdate)
       .catch((error) => {
         console.error("Error:", error);
+      })
+      .finally(() => {
+        inFlight = false;
+        // Changements arrivés pendant la requête
+        flushUpdates();
       });
+  }
+
+  effectCheckboxes.forEach(([checkbox]) => {
+    checkbox.addEventListener("change", () => {
+      queueUpdate("selected_effects", selectedEffects());
+    });
+  });
+  settingSliders.forEach(([slider, key]) => {
+    slider.addEventListener("input", () => {
+      queueUpdate(key, parseInt(slider.value));
+    });
   });
+
+  // Envoie tout de suite ce qui attend encore
+  applyEffectsButton.addEventListener("click", flushUpdates);
 });
@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from common.effects import EFFECTS, compile_chain, seed_glitch
+from common.inference import InferenceResults, run_inference
+from common.lut import ColorLUTStep
+from common.pipeline import BufferPool, LatestQueue, PipelineStage
+from common.tracking import KeyframeTracker
+
+
+# Mesures sans caméra ni interface, résultats en JSON :
+#   python -m common.benchmark --output bench.json
+# Les images sont synthétiques ou lues dans une vidéo (--video), les points
+# de repère viennent d'un enregistrement (--fixture) ou sont synthétiques.
+RESOLUTIONS = {
+    "480p": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+# Chaînes représentatives des usages courants
+CHAINS = {
+    "landmarks": ["Deformation", "Mirror", "Face Mask", "Hand Tracking"],
+    "colour": ["Rainbow", "Sepia", "Color Filter", "Brightness/Contrast"],
+    "stylise": ["Cartoon", "Vignette", "Glitch"],
+    "background": ["Background Distortion", "Face Mask", "Brightness/Contrast"],
+}
+
+# Réglages des effets pendant les mesures (mêmes valeurs que l'interface)
+SETTINGS = {
+    "deformation_intensity": 1,
+    "pointillism_size": 2,
+    "facemask_point_size": 5,
+    "mirror_intensity": 1,
+    "color_intensity": 5,
+    "blur_intensity": 1,
+    "vignette_intensity": 1,
+    "glitch_band_height": 4,
+    "glitch_displacement": 10,
+    "background_blur": 30,
+    "brightness": 10,
+    "contrast": 10,
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize(samples):
+    samples = np.asarray(samples, dtype=np.float64) * 1000
+    summary = {"iterations": len(samples)}
+    if not len(samples):
+        return summary
+    summary.update({"p{}".format(p): float(v)
+                    for p, v in zip(PERCENTILES, np.percentile(samples, PERCENTILES))})
+    summary.update(mean=float(samples.mean()), min=float(samples.min()),
+                   max=float(samples.max()))
+    return summary
+
+
+def synthetic_frame(size, seed=0):
+    # Image texturée reproductible : dégradés, formes et bruit adouci, pour
+    # que les filtres dépendant du contenu travaillent comme sur une vraie
+    width, height = size
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = x[None, :]
+    frame[..., 1] = y[:, None]
+    frame[..., 2] = 128
+    for _ in range(20):
+        center = (int(rng.integers(width)), int(rng.integers(height)))
+        radius = int(rng.integers(10, max(11, height // 4)))
+        color = rng.integers(0, 256, size=3).tolist()
+        cv2.circle(frame, center, radius, color, -1)
+    noise = rng.integers(-20, 21, size=frame.shape, dtype=np.int16)
+    frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(frame, (3, 3), 0)
+
+
+def synthetic_fixture(seed=0):
+    # Une personne face caméra : pose, un visage et deux mains aux positions
+    # plausibles, masque de segmentation elliptique (coordonnées normalisées)
+    rng = np.random.default_rng(seed)
+
+    def cluster(count, center, spread):
+        points = rng.normal(center + (0,), spread + (0.02,), size=(count, 3))
+        return points.astype(np.float32)
+
+    mask = np.zeros((360, 640), dtype=np.uint8)
+    cv2.ellipse(mask, (320, 220), (120, 200), 0, 0, 360, 255, -1)
+    return {
+        "pose": cluster(33, (0.5, 0.55), (0.15, 0.25)),
+        "faces": [cluster(478, (0.5, 0.3), (0.06, 0.08))],
+        "left_hand": cluster(21, (0.3, 0.6), (0.03, 0.04)),
+        "right_hand": cluster(21, (0.7, 0.6), (0.03, 0.04)),
+        "segmentation_mask": mask.astype(np.float32) / 255,
+    }
+
+
+def save_fixture(path, results):
+    arrays = {"segmentation_mask": results.segmentation_mask}
+    if results.pose is not None:
+        arrays["pose"] = results.pose
+    for index, face in enumerate(results.faces):
+        arrays["face{}".format(index)] = face
+    for name in ("left_hand", "right_hand"):
+        if getattr(results, name) is not None:
+            arrays[name] = getattr(results, name)
+    np.savez_compressed(path, **{key: value for key, value in arrays.items()
+                                 if value is not None})
+
+
+def load_fixture(path):
+    with np.load(path) as data:
+        faces = [data[key] for key in sorted(data.files) if key.startswith("face")]
+        return {
+            "pose": data["pose"] if "pose" in data.files else None,
+            "faces": faces,
+            "left_hand": data["left_hand"] if "left_hand" in data.files else None,
+            "right_hand": data["right_hand"] if "right_hand" in data.files else None,
+            "segmentation_mask": (data["segmentation_mask"]
+                                  if "segmentation_mask" in data.files else None),
+        }
+
+
+def fixture_results(fixture):
+    # Nouveaux résultats à chaque image : le cache de coordonnées en pixels
+    # est recalculé comme en fonctionnement normal
+    return InferenceResults(fixture["pose"], list(fixture["faces"]),
+                            fixture["left_hand"], fixture["right_hand"],
+                            segmentation_mask=fixture["segmentation_mask"])
+
+
+def video_frames(path, size, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+    finally:
+        cap.release()
+    if not frames:
+        raise IOError("Aucune image lue dans {}".format(path))
+    return frames
+
+
+def wait_ready(chain):
+    # Les tables de couleur sont calculées en arrière-plan : on mesure le
+    # régime établi, pas la construction
+    for step in chain.steps:
+        if isinstance(step, ColorLUTStep):
+            step.ready.wait()
+
+
+def time_chain(chain, frames, fixture, iterations, warmup):
+    wait_ready(chain)
+    samples = []
+    # Sortie réutilisée, comme dans les interfaces
+    output = np.empty_like(frames[0])
+    for index in range(warmup + iterations):
+        # Copie hors mesure : certains effets modifient l'image reçue
+        frame = frames[index % len(frames)].copy()
+        results = fixture_results(fixture)
+        start = time.perf_counter()
+        chain(frame, results, out=output)
+        elapsed = time.perf_counter() - start
+        if index >= warmup:
+            samples.append(elapsed)
+    return summarize(samples)
+
+
+def bench_effects(names, frames, fixture, iterations, warmup):
+    return {name: time_chain(compile_chain([name], SETTINGS), frames, fixture,
+                             iterations, warmup)
+            for name in names}
+
+
+def bench_chains(chains, frames, fixture, iterations, warmup):
+    return {name: dict(time_chain(compile_chain(effects, SETTINGS), frames, fixture,
+                                  iterations, warmup), effects=effects)
+            for name, effects in chains.items()}
+
+
+def bench_inference(frames, iterations, warmup, inference_width=640):
+    report = {}
+    for kind in ("pose", "face", "hands", "segmentation"):
+        samples = []
+        for index in range(warmup + iterations):
+            frame = frames[index % len(frames)]
+            start = time.perf_counter()
+            run_inference(frame, {kind}, use_holistic=False, inference_width=inference_width)
+            elapsed = time.perf_counter() - start
+            if index >= warmup:
+                samples.append(elapsed)
+        report[kind] = summarize(samples)
+    return report
+
+
+def bench_pipeline(frames, effects, infer, duration, capture_fps=30,
+                   keyframe_interval=1):
+    # Même découpage que VideoThread : capture, inférence, rendu et sortie
+    # dans des threads reliés par des files où l'image la plus récente gagne.
+    # La capture lit les images en boucle à capture_fps (0 : sans limite).
+    chain = compile_chain(effects, SETTINGS)
+    wait_ready(chain)
+    tracker = KeyframeTracker(interval=keyframe_interval)
+    stop_event = threading.Event()
+    inference_queue = LatestQueue(maxsize=1)
+    render_queue = LatestQueue(maxsize=1)
+    render_pool = BufferPool(3)
+    output_queue = LatestQueue(maxsize=1, on_drop=lambda item: render_pool.release(item[1]))
+    counter = {"captured": 0}
+    period = 1.0 / capture_fps if capture_fps else 0
+
+    def capture():
+        if period:
+            time.sleep(period)
+        frame = frames[counter["captured"] % len(frames)].copy()
+        counter["captured"] += 1
+        return time.perf_counter(), frame
+
+    def inference(item):
+        timestamp, frame = item
+        return timestamp, frame, tracker.process(frame, chain.needs, infer)
+
+    def render(item):
+        timestamp, frame, results = item
+        buffer = render_pool.acquire(frame.shape, frame.dtype)
+        output = chain(frame, results, out=buffer)
+        if output is not buffer:
+            render_pool.release(buffer)
+        return timestamp, output
+
+    stages = [
+        PipelineStage("capture", capture, None, inference_queue, stop_event),
+        PipelineStage("inference", inference, inference_queue, render_queue, stop_event),
+        PipelineStage("render", render, render_queue, output_queue, stop_event),
+    ]
+    for stage in stages:
+        stage.start()
+
+    # Sortie : encodage JPEG comme pour le flux Web
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        try:
+            timestamp, frame = output_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        cv2.imencode(".jpg", frame)
+        render_pool.release(frame)
+        latencies.append(time.perf_counter() - timestamp)
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    for stage in stages:
+        stage.join()
+
+    report = summarize(latencies)
+    report.update(
+        effects=effects,
+        output_fps=len(latencies) / elapsed,
+        captured=counter["captured"],
+        dropped=inference_queue.dropped + render_queue.dropped + output_queue.dropped,
+    )
+    return report
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=False).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure les effets et le pipeline sans caméra")
+    parser.add_argument("--output", help="fichier JSON de résultats (par défaut : sortie standard)")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS),
+                        choices=list(RESOLUTIONS))
+    parser.add_argument("--effects", nargs="+", default=None,
+                        help="effets mesurés seuls (par défaut : tous)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--video", help="vidéo source des images au lieu d'images synthétiques")
+    parser.add_argument("--fixture", help="points de repère enregistrés (.npz)")
+    parser.add_argument("--record-fixture", metavar="NPZ",
+                        help="enregistre les points de la première image de --video puis quitte")
+    parser.add_argument("--models", action="store_true",
+                        help="mesure aussi l'inférence MediaPipe et l'utilise dans le pipeline")
+    parser.add_argument("--pipeline-seconds", type=float, default=3.0,
+                        help="durée de la mesure du pipeline complet (0 : ignorée)")
+    parser.add_argument("--capture-fps", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.record_fixture:
+        if not args.video:
+            parser.error("--record-fixture demande --video")
+        frame = video_frames(args.video, RESOLUTIONS["720p"], 1)[0]
+        results = run_inference(frame, {"pose", "face", "hands", "segmentation"},
+                                use_holistic=False, inference_width=640)
+        save_fixture(args.record_fixture, results)
+        return 0
+
+    seed_glitch(args.seed)
+    fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture(args.seed)
+    names = args.effects or list(EFFECTS)
+    report = {"meta": metadata(), "settings": SETTINGS, "resolutions": {}}
+    for label in args.resolutions:
+        size = RESOLUTIONS[label]
+        if args.video:
+            frames = video_frames(args.video, size, 30)
+        else:
+            frames = [synthetic_frame(size, args.seed + index) for index in range(4)]
+
+        section = {
+            "effects": bench_effects(names, frames, fixture, args.iterations, args.warmup),
+            "chains": bench_chains(CHAINS, frames, fixture, args.iterations, args.warmup),
+        }
+        if args.models:
+            section["inference"] = bench_inference(frames, args.iterations, args.warmup)
+
+        if args.pipeline_seconds > 0:
+            if args.models:
+                def infer(frame, needs):
+                    return run_inference(frame, needs, use_holistic=False, inference_width=640)
+            else:
+                def infer(frame, needs):
+                    return fixture_results(fixture)
+            section["pipeline"] = {
+                name: bench_pipeline(frames, effects, infer, args.pipeline_seconds,
+                                     args.capture_fps)
+                for name, effects in CHAINS.items()
+            }
+        report["resolutions"][label] = section
+        print("{} : terminé".format(label), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
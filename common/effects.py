@@ -0,0 +1,559 @@
+import functools
+import inspect
+
+import cv2
+import numpy as np
+import mediapipe as mp
+
+from common.lut import ChannelLUTStep, ColorLUTStep
+from common.metrics import metrics
+from common.pipeline import BufferPool
+from common.splat import disc_offsets, splat, square_offsets
+
+PoseLandmark = mp.solutions.pose.PoseLandmark
+
+# Indices des points de pose utilisés par les effets
+EYES_AND_WRISTS = np.array([PoseLandmark.LEFT_EYE, PoseLandmark.RIGHT_EYE,
+                            PoseLandmark.LEFT_WRIST, PoseLandmark.RIGHT_WRIST])
+NOSE_AND_MOUTH = np.array([PoseLandmark.NOSE, PoseLandmark.MOUTH_LEFT, PoseLandmark.MOUTH_RIGHT])
+WRISTS = np.array([PoseLandmark.LEFT_WRIST, PoseLandmark.RIGHT_WRIST])
+FACE_POINTS = np.array([PoseLandmark.LEFT_EYE, PoseLandmark.RIGHT_EYE, PoseLandmark.NOSE,
+                        PoseLandmark.MOUTH_LEFT, PoseLandmark.MOUTH_RIGHT])
+WRISTS_AND_KNEES = np.array([PoseLandmark.LEFT_WRIST, PoseLandmark.RIGHT_WRIST,
+                             PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE])
+
+
+# Registre des effets partagé par la version PyQt et la version Web
+EFFECTS = {}
+
+
+class Effect:
+    # params : clés des réglages (effect_settings) passées à la fonction
+    # landmarks : points de repère nécessaires ("pose", "face", "hands")
+    # in_place : l'effet modifie l'image reçue au lieu d'en créer une
+    # color : "channel" si chaque canal de sortie ne dépend que du même canal
+    # d'entrée, "pixel" si la couleur de sortie ne dépend que de la couleur du
+    # pixel ; ces effets peuvent être fusionnés en une table (LUT)
+    # Un effet qui crée son image peut accepter out= : il écrit alors dans ce
+    # tableau, de même forme que l'image, au lieu d'en allouer un
+    def __init__(self, name, func, params=(), landmarks=(), in_place=False, color=None):
+        self.name = name
+        self.func = func
+        self.params = tuple(params)
+        self.landmarks = frozenset(landmarks)
+        self.in_place = in_place
+        self.color = color
+        self.accepts_out = "out" in inspect.signature(func).parameters
+
+    @property
+    def mode(self):
+        if self.in_place:
+            return "in_place"
+        return "out" if self.accepts_out else "new"
+
+    def bind(self, settings):
+        kwargs = {param: settings[param]
+                  for param in self.params if param in settings}
+        return functools.partial(self.func, **kwargs)
+
+
+def register(name, params=(), landmarks=(), in_place=False, color=None):
+    def decorator(func):
+        EFFECTS[name] = Effect(name, func, params, landmarks, in_place, color)
+        return func
+    return decorator
+
+
+def required_landmarks(selected_effects):
+    needs = set()
+    for name in selected_effects:
+        effect = EFFECTS.get(name)
+        if effect:
+            needs |= effect.landmarks
+    return needs
+
+
+class EffectChain:
+    # Liste à plat de fonctions déjà liées à leurs réglages : aucune
+    # recherche par nom ni lecture des réglages à chaque image. labels nomme
+    # chaque étape pour les mesures ("Sepia+Rainbow" pour une table fusionnée).
+    # modes indique comment chaque étape produit son image : "in_place"
+    # (modifie son entrée), "out" (écrit dans out=) ou "new" (alloue).
+    #
+    # Les images intermédiaires alternent entre deux tampons de la chaîne ;
+    # la dernière étape qui crée une image écrit directement dans le out du
+    # demandeur. Le résultat est donc out, l'image reçue (si toutes les
+    # étapes travaillent en place) ou une image neuve, jamais un tampon interne.
+    def __init__(self, names, steps, needs, labels=None, modes=None):
+        self.names = names
+        self.steps = steps
+        self.needs = needs
+        self.labels = labels or [getattr(step, "__name__", type(step).__name__)
+                                 for step in steps]
+        self.modes = modes or ["new"] * len(steps)
+        self._scratch = BufferPool(2)
+        # Dernière étape qui ne travaille pas en place : si elle accepte out=,
+        # c'est elle qui écrit le résultat
+        self._target = None
+        for index, mode in enumerate(self.modes):
+            if mode != "in_place":
+                self._target = index if mode == "out" else None
+
+    def __call__(self, frame, results, out=None):
+        timed = metrics.enabled
+        scratch = []
+        current = frame
+        for index, (step, mode) in enumerate(zip(self.steps, self.modes)):
+            if mode == "out":
+                if index == self._target:
+                    kwargs = {"out": out}
+                else:
+                    kwargs = {"out": self._scratch_buffer(scratch, current)}
+            else:
+                kwargs = {}
+            if timed:
+                with metrics.time("effect", self.labels[index]):
+                    current = step(current, results, **kwargs)
+            else:
+                current = step(current, results, **kwargs)
+
+        if any(current is buffer for buffer in scratch):
+            # Une étape a rendu son entrée telle quelle (aucun point détecté)
+            if out is None:
+                out = np.empty_like(current)
+            np.copyto(out, current)
+            current = out
+        for buffer in scratch:
+            self._scratch.release(buffer)
+        return current
+
+    def _scratch_buffer(self, scratch, current):
+        # Un tampon interne différent de l'entrée de l'étape
+        for buffer in scratch:
+            if buffer is not current and buffer.shape == current.shape:
+                return buffer
+        buffer = self._scratch.acquire(current.shape, current.dtype)
+        scratch.append(buffer)
+        return buffer
+
+
+def compile_chain(selected_effects, settings):
+    # À recompiler à chaque changement de sélection ou de réglage
+    names = [name for name in selected_effects if name in EFFECTS]
+    fused = fuse_color_runs(names, [EFFECTS[name].bind(settings) for name in names])
+    return EffectChain(names, [step for _, step, _ in fused], required_landmarks(names),
+                       [label for label, _, _ in fused], [mode for _, _, mode in fused])
+
+
+def fuse_color_runs(names, steps):
+    # Les effets de couleur consécutifs sont remplacés par une seule table.
+    # Renvoie des triplets (nom, étape, mode).
+    fused = []
+    run = []
+    for name, step in zip(names + [None], steps + [None]):
+        if name is not None and EFFECTS[name].color:
+            run.append((name, step))
+            continue
+        if run:
+            fused.extend(fuse_color_run(run))
+            run = []
+        if step is not None:
+            fused.append((name, step, EFFECTS[name].mode))
+    return fused
+
+
+def fuse_color_run(run):
+    # Les effets canal par canal neutres (Brightness/Contrast à 0/0, toujours
+    # ajouté par la version PyQt) sont retirés d'abord : un seul effet restant
+    # garde son implémentation OpenCV au lieu d'une table 24 bits
+    run = [(name, step) for name, step in run
+           if EFFECTS[name].color != "channel" or not ChannelLUTStep([step]).is_identity()]
+    if not run:
+        return []
+    label = "+".join(name for name, _ in run)
+    steps = [step for _, step in run]
+    if all(EFFECTS[name].color == "channel" for name, _ in run):
+        lut_step = ChannelLUTStep(steps)
+        return [] if lut_step.is_identity() else [(label, lut_step, "out")]
+    if len(run) == 1:
+        # Un seul effet : son implémentation OpenCV est plus rapide que la table
+        return [(label, steps[0], EFFECTS[label].mode)]
+    key = tuple((name, tuple(sorted(step.keywords.items()))) for name, step in run)
+    return [(label, ColorLUTStep(steps, key), "out")]
+
+
+@register("Deformation", params=("deformation_intensity",), landmarks=("pose",), in_place=True)
+def apply_deformation(frame, results, deformation_intensity=1):
+    if results.pose is None:
+        return frame
+    points = results.pixels(results.pose, (frame.shape[1], frame.shape[0]))
+    for x, y in points[EYES_AND_WRISTS].tolist():
+        size = int(30 * deformation_intensity)
+
+        src_points = np.float32(
+            [[x - size, y - size], [x + size, y - size], [x + size, y + size], [x - size, y + size]])
+        dst_points = np.float32([[x - size, y - int(size * 1.5)], [x + size, y - int(
+            size * 1.5)], [x + size, y + int(size * 1.5)], [x - size, y + int(size * 1.5)]])
+        matrix = cv2.getPerspectiveTransform(src_points, dst_points)
+        # Seul le carré source est remplacé par l'image déformée
+        warp_region(frame, matrix, (x - size, y - size, x + size, y + size))
+    return frame
+
+
+def warp_region(frame, matrix, box):
+    # Même résultat, au bit près, qu'un warpPerspective de toute l'image
+    # suivi d'une copie de box (bornes incluses), mais seuls les pixels de
+    # box sont calculés. Les coordonnées source sont celles que calcule
+    # warpPerspective : matrice inverse en float32 appliquée aux coordonnées
+    # absolues des pixels. Un changement de repère vers box arrondirait
+    # autrement et décalerait certains pixels d'un niveau.
+    height, width = frame.shape[:2]
+    left, top, right, bottom = box
+    left, top = max(left, 0), max(top, 0)
+    right, bottom = min(right, width - 1), min(bottom, height - 1)
+    if left > right or top > bottom:
+        return frame
+
+    inverse = cv2.invert(matrix, flags=cv2.DECOMP_LU)[1].astype(np.float32)
+    xs = np.arange(left, right + 1, dtype=np.float32)[None, :]
+    ys = np.arange(top, bottom + 1, dtype=np.float32)[:, None]
+    w = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+    map_x = (inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / w
+    map_y = (inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / w
+    # Lecture hors de l'image : noir, comme warpPerspective
+    frame[top:bottom + 1, left:right + 1] = cv2.remap(
+        frame, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+    return frame
+
+
+@register("Mirror", params=("mirror_intensity",), landmarks=("pose",), in_place=True)
+def apply_mirror_effect(frame, results, mirror_intensity=1):
+    if results.pose is None:
+        return frame
+    points = results.pixels(results.pose, (frame.shape[1], frame.shape[0]))
+    for x, y in points[NOSE_AND_MOUTH].tolist():
+        size = 100 * mirror_intensity  # Augmenter l'intensité de l'effet miroir
+
+        left = max(x - size, 0)
+        right = min(x + size, frame.shape[1])
+        top = max(y - size, 0)
+        bottom = min(y + size, frame.shape[0])
+
+        if left < right and top < bottom:
+            frame[top:bottom, left:right] = cv2.flip(
+                frame[top:bottom, left:right], 1)
+    return frame
+
+
+@register("Color Change", landmarks=("pose",), in_place=True)
+def change_color(frame, results):
+    if results.pose is None:
+        return frame
+    points = results.pixels(results.pose, (frame.shape[1], frame.shape[0]))
+    for x, y in points[WRISTS].tolist():
+        size = 30
+
+        left = max(x - size, 0)
+        right = min(x + size, frame.shape[1])
+        top = max(y - size, 0)
+        bottom = min(y + size, frame.shape[0])
+
+        if left < right and top < bottom:
+            frame[top:bottom, left:right] = cv2.applyColorMap(
+                frame[top:bottom, left:right], cv2.COLORMAP_JET)
+    return frame
+
+
+@register("Fun Filters", landmarks=("pose",), in_place=True)
+def add_fun_filters(frame, results):
+    if results.pose is None:
+        return frame
+    points = results.pixels(results.pose, (frame.shape[1], frame.shape[0]))
+    left_eye_x, left_eye_y = points[PoseLandmark.LEFT_EYE].tolist()
+    right_eye_x, right_eye_y = points[PoseLandmark.RIGHT_EYE].tolist()
+    mouth_left_x, mouth_left_y = points[PoseLandmark.MOUTH_LEFT].tolist()
+    mouth_right_x, mouth_right_y = points[PoseLandmark.MOUTH_RIGHT].tolist()
+
+    cv2.line(frame, (left_eye_x - 20, left_eye_y),
+             (right_eye_x + 20, right_eye_y), (0, 0, 0), 5)
+    cv2.circle(frame, (left_eye_x, left_eye_y), 30, (0, 0, 0), 5)
+    cv2.circle(frame, (right_eye_x, right_eye_y), 30, (0, 0, 0), 5)
+
+    cv2.line(frame, (mouth_left_x, mouth_left_y + 10),
+             (mouth_right_x, mouth_right_y + 10), (0, 0, 0), 10)
+    cv2.line(frame, (mouth_left_x - 10, mouth_left_y + 20),
+             (mouth_right_x + 10, mouth_right_y + 20), (0, 0, 0), 10)
+    return frame
+
+
+@register("Bubble", landmarks=("pose",), in_place=True)
+def add_bubble_effect(frame, results):
+    if results.pose is None:
+        return frame
+    points = results.pixels(results.pose, (frame.shape[1], frame.shape[0]))
+    for x, y in points[FACE_POINTS].tolist():
+        radius = 30
+
+        cv2.circle(frame, (x, y), radius, (255, 255, 255), 3)
+    return frame
+
+
+@register("Wave", landmarks=("pose",), in_place=True)
+def add_wave_effect(frame, results):
+    if results.pose is None:
+        return frame
+    points = results.pixels(results.pose, (frame.shape[1], frame.shape[0]))
+    for x, y in points[WRISTS_AND_KNEES].tolist():
+        size = 30
+
+        rng = np.random.default_rng(seed=42)
+        for i in rng.integers(1, 6, size=5):
+            cv2.circle(frame, (x, y), size + i * 5, (0, 255, 255), 2)
+    return frame
+
+
+@register("Pointillism", params=("pointillism_size", "splat_step"), landmarks=("pose",))
+def apply_pointillism_effect(frame, results, pointillism_size=2, splat_step=1, out=None):
+    if results.pose is None:
+        return frame
+    if out is None:
+        output = np.zeros_like(frame)
+    else:
+        output = out
+        output.fill(0)
+    height, width, _ = frame.shape
+    points = results.pixels(results.pose, (width, height))
+    inside = ((points[:, 0] >= 0) & (points[:, 0] < width)
+              & (points[:, 1] >= 0) & (points[:, 1] < height))
+    points = points[inside][::splat_step]
+    # Couleurs lues en une fois, disques tamponnés en une fois
+    colors = frame[points[:, 1], points[:, 0]]
+    return splat(output, points, disc_offsets(pointillism_size), colors)
+
+
+@register("Face Morphing", params=("splat_step",), landmarks=("face",), in_place=True)
+def apply_face_morphing(frame, results, splat_step=1):
+    for face in results.faces:
+        points = results.pixels(face, (frame.shape[1], frame.shape[0]))[::splat_step]
+        # Un point hors de l'image par le haut ou la gauche n'est pas dessiné
+        points = points[(points >= 0).all(axis=1)]
+        splat(frame, points, square_offsets(3), (0, 255, 0))
+    return frame
+
+
+@register("Face Mask", params=("facemask_point_size", "splat_step"), landmarks=("face",),
+          in_place=True)
+def apply_face_mask(frame, results, facemask_point_size=5, splat_step=1):
+    for face in results.faces:
+        points = results.pixels(face, (frame.shape[1], frame.shape[0]))[::splat_step]
+        splat(frame, points, disc_offsets(facemask_point_size), (255, 0, 0))
+    return frame
+
+
+@register("Hand Tracking", landmarks=("hands",), in_place=True)
+def apply_hand_tracking_effect(frame, results):
+    for hand in results.hands:
+        frame = draw_hand_landmarks(frame, results.pixels(hand, (frame.shape[1], frame.shape[0])))
+    return frame
+
+
+def draw_hand_landmarks(frame, points):
+    return splat(frame, points, disc_offsets(5), (0, 255, 0))
+
+
+@register("Background Distortion", params=("background_blur", "kernel_scale"),
+          landmarks=("segmentation",))
+def apply_background_distortion(frame, results, background_blur=30, kernel_scale=1.0, out=None):
+    mask = results.segmentation_mask
+    if mask is None:
+        return frame
+    height, width = frame.shape[:2]
+    output = pyramid_blur(frame, background_blur * kernel_scale, out)
+
+    # Le masque est adouci et passé sur trois canaux à basse résolution : le
+    # fondu sur le bord de la personne coûte alors presque rien. Seul
+    # l'agrandissement écrit une image pleine, dans un tampon réutilisé.
+    alpha = cv2.GaussianBlur(mask, (0, 0), FEATHER_SIGMA)
+    alpha = cv2.convertScaleAbs(alpha, alpha=255)
+    alpha = cv2.merge([alpha, alpha, alpha])
+    full_alpha = _blend_buffers.acquire(frame.shape)
+    foreground = _blend_buffers.acquire(frame.shape)
+    cv2.resize(alpha, (width, height), dst=full_alpha, interpolation=cv2.INTER_LINEAR)
+
+    # output = frame * alpha + flou * (1 - alpha), écrit dans l'image floue
+    cv2.multiply(frame, full_alpha, dst=foreground, scale=1 / 255)
+    cv2.bitwise_not(full_alpha, dst=full_alpha)
+    cv2.multiply(output, full_alpha, dst=output, scale=1 / 255)
+    cv2.add(output, foreground, dst=output)
+    _blend_buffers.release(full_alpha)
+    _blend_buffers.release(foreground)
+    return output
+
+
+# Alpha plein et premier plan du fondu, réutilisés d'une image à l'autre
+_blend_buffers = BufferPool(2)
+
+
+# Largeur du fondu entre la personne et le fond, en pixels du masque
+FEATHER_SIGMA = 2
+
+
+def pyramid_blur(frame, sigma, out=None):
+    # Flou gaussien de grand sigma calculé sur une copie réduite puis
+    # agrandie : l'image réduite d'un facteur f n'a besoin que d'un flou de
+    # sigma / f, pour un résultat visuellement identique et bien plus rapide
+    if sigma <= 0:
+        if out is None:
+            return frame.copy()
+        np.copyto(out, frame)
+        return out
+    height, width = frame.shape[:2]
+    factor = 1
+    while sigma / (factor * 2) >= 2 and min(width, height) // (factor * 2) >= 16:
+        factor *= 2
+    small = cv2.resize(frame, (width // factor, height // factor),
+                       interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (0, 0), sigma / factor)
+    return cv2.resize(small, (width, height), dst=out, interpolation=cv2.INTER_LINEAR)
+
+
+@register("Rainbow", color="pixel")
+def apply_rainbow_effect(frame, results, out=None):
+    # Conversions faites dans out : aucune image intermédiaire
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=out)
+    hue = hsv[..., 0]
+    # La teinte va de 0 à 179 : + 10 tient dans un uint8
+    np.add(hue, 10, out=hue)
+    np.remainder(hue, 180, out=hue)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=hsv)
+
+
+# Générateur du décalage des bandes ; seed_glitch() le rend reproductible
+glitch_rng = np.random.default_rng()
+
+
+def seed_glitch(seed=None):
+    global glitch_rng
+    glitch_rng = np.random.default_rng(seed)
+
+
+@register("Glitch", params=("glitch_band_height", "glitch_displacement"))
+def apply_glitch_effect(frame, results, glitch_band_height=4, glitch_displacement=10, out=None):
+    # Chaque bande de glitch_band_height lignes est décalée horizontalement
+    # (avec retour à l'autre bord) d'un nombre de pixels tiré dans
+    # [-glitch_displacement, glitch_displacement[
+    height, width, channels = frame.shape
+    d = min(glitch_displacement, width)
+    if d <= 0:
+        return frame
+    bands = -(-height // glitch_band_height)
+    shifts = glitch_rng.integers(-d, d, size=bands)
+
+    # Une ligne décalée de s est la fenêtre de width pixels commençant à la
+    # colonne d - s de la ligne prolongée de d pixels de chaque côté. Les
+    # lignes d'une bande ont le même décalage : une copie de bloc par bande,
+    # directement dans out, l'image prolongée étant un tampon réutilisé.
+    padded = _glitch_padded.acquire((height, width + 2 * d, channels))
+    cv2.copyMakeBorder(frame, 0, 0, d, d, cv2.BORDER_WRAP, dst=padded)
+    if out is None:
+        out = np.empty_like(frame)
+    for top, shift in zip(range(0, height, glitch_band_height), (d - shifts).tolist()):
+        bottom = top + glitch_band_height
+        out[top:bottom] = padded[top:bottom, shift:shift + width]
+    _glitch_padded.release(padded)
+    return out
+
+
+# Image prolongée du glitch, réutilisée d'une image à l'autre
+_glitch_padded = BufferPool(1)
+
+
+@register("Sepia", color="pixel")
+def apply_sepia_effect(frame, results, out=None):
+    sepia_filter = np.array([[0.272, 0.534, 0.131],
+                             [0.349, 0.686, 0.168],
+                             [0.393, 0.769, 0.189]])
+    # cv2.transform sature déjà le résultat dans [0, 255]
+    return cv2.transform(frame, sepia_filter, dst=out)
+
+
+@register("Color Filter", params=("color_intensity",), color="pixel")
+def apply_color_filter(frame, results, color_intensity=5, out=None):
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=out)
+    saturation = hsv[..., 1]
+    np.multiply(saturation, color_intensity / 10.0, out=saturation, casting="unsafe")
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=hsv)
+
+
+@register("Blur", params=("blur_intensity", "kernel_scale"))
+def apply_blur(frame, results, blur_intensity=1, kernel_scale=1.0, out=None):
+    size = round(blur_intensity * kernel_scale) * 2 + 1
+    return cv2.GaussianBlur(frame, (size, size), 0, dst=out)
+
+
+@register("Vignette", params=("vignette_intensity",))
+def apply_vignette(frame, results, vignette_intensity=1, out=None):
+    mask = vignette_mask(frame.shape[0], frame.shape[1], vignette_intensity)
+    return cv2.multiply(frame, mask, dst=out, dtype=cv2.CV_8U)
+
+
+# Les masques ne dépendent que de la taille de l'image et des réglages : ils
+# sont calculés une fois puis réutilisés. Les tableaux sont partagés entre
+# les appels et donc en lecture seule.
+@functools.lru_cache(maxsize=8)
+def vignette_mask(rows, cols, intensity):
+    kernel_x = cv2.getGaussianKernel(cols, cols / (intensity + 1))
+    kernel_y = cv2.getGaussianKernel(rows, rows / (intensity + 1))
+    kernel = kernel_y * kernel_x.T
+    # Gain 1 au centre, décroissant vers les bords : l'image n'est assombrie
+    # que sur ses côtés, quelle que soit sa taille
+    mask = (kernel / kernel.max()).astype(np.float32)
+    # Masque sur trois canaux : une seule multiplication pour toute l'image
+    mask = cv2.merge([mask, mask, mask])
+    mask.flags.writeable = False
+    return mask
+
+
+@register("Cartoon", params=("kernel_scale",))
+def apply_cartoon_effect(frame, results, kernel_scale=1.0, out=None):
+    # Niveaux de gris, contours et contours sur trois canaux : tampons
+    # réutilisés d'une image à l'autre
+    gray = _cartoon_gray.acquire(frame.shape[:2])
+    smooth = _cartoon_gray.acquire(frame.shape[:2])
+    edges = _cartoon_edges.acquire(frame.shape)
+    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+    cv2.medianBlur(gray, 7, dst=smooth)
+    cv2.adaptiveThreshold(smooth, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 9, 10,
+                          dst=gray)
+    # Le coût du filtre bilatéral croît avec le carré de son diamètre
+    color = cv2.bilateralFilter(frame, max(3, round(9 * kernel_scale)), 250, 250, dst=out)
+    # Avec un masque, bitwise_and laisserait intacts les pixels masqués de
+    # color : on applique plutôt les contours (0 ou 255) sur les trois canaux
+    cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=edges)
+    cv2.bitwise_and(color, edges, dst=color)
+    _cartoon_gray.release(gray)
+    _cartoon_gray.release(smooth)
+    _cartoon_edges.release(edges)
+    return color
+
+
+_cartoon_gray = BufferPool(2)
+_cartoon_edges = BufferPool(1)
+
+
+@register("Brightness/Contrast", params=("brightness", "contrast"), color="channel")
+def adjust_brightness_contrast(frame, results, brightness=0, contrast=0):
+    if brightness != 0:
+        shadow = brightness if brightness > 0 else 0
+        highlight = 255 if brightness > 0 else 255 + brightness
+        alpha_b = (highlight - shadow) / 255
+        gamma_b = shadow
+        frame = cv2.addWeighted(frame, alpha_b, frame, 0, gamma_b)
+
+    if contrast != 0:
+        f = 131 * (contrast + 127) / (127 * (131 - contrast))
+        alpha_c = f
+        gamma_c = 127 * (1 - f)
+        frame = cv2.addWeighted(frame, alpha_c, frame, 0, gamma_c)
+
+    return frame
@@ -0,0 +1,439 @@
+import argparse
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from common.effects import compile_chain
+from common.inference import run_inference
+from common.metrics import metrics
+from common.offline import DEFAULT_SETTINGS, parse_setting
+from common.pipeline import LatestQueue
+from common.recorder import AsyncRecorder
+from common.tracking import KeyframeTracker
+from common.workers import InferencePool
+
+
+# Plusieurs caméras ou fichiers traités par un seul processus :
+#   python -m common.engine 0 1 salle.mp4 --effects "Face Mask" --grid grille.avi
+# Chaque source a sa capture, ses réglages, son tracker et sa sortie ; le
+# traitement (inférence + effets) est partagé entre quelques threads et,
+# avec inference_workers, un seul jeu de processus d'inférence pour toutes
+# les sources.
+
+# Cadence de la grille composite
+GRID_FPS = 15
+GRID_SIZE = (1280, 720)
+
+
+def parse_source(text):
+    # "0" désigne la caméra 0 ; tout le reste est un fichier ou une URL
+    return int(text) if text.isdigit() else text
+
+
+class Source:
+    # Une caméra, un fichier ou un flux réseau. Les fichiers sont lus à leur
+    # propre cadence (realtime) comme une caméra, ou aussi vite que le
+    # traitement le permet sans perdre d'image (realtime=False).
+    def __init__(self, uri, name=None, settings=None, loop=False, realtime=True,
+                 capture_size=None):
+        self.uri = uri
+        self.name = name or str(uri)
+        self.is_file = isinstance(uri, str) and os.path.exists(uri)
+        self.loop = loop
+        self.realtime = realtime or not self.is_file
+        self.capture_size = capture_size
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.chain = compile_chain(self.settings["selected_effects"], self.settings)
+        self.tracker = KeyframeTracker(interval=self.settings["keyframe_interval"],
+                                       motion_threshold=self.settings["motion_threshold"])
+        self.fps = None
+        self.frame_size = None
+        self.captured_frames = 0
+        self.processed_frames = 0
+        self.dropped_frames = 0
+        self.finished = False
+        # Image en attente de traitement (la plus récente gagne) et drapeau
+        # indiquant qu'un thread de traitement s'occupe de la source
+        self.pending = None
+        self.busy = False
+        self.latest = None
+        self._consumed = threading.Event()
+        self._consumed.set()
+
+    def update_settings(self, **settings):
+        # Chaîne recompilée ici, remplacée d'une seule affectation
+        self.settings.update(settings)
+        self.chain = compile_chain(self.settings["selected_effects"], self.settings)
+        self.tracker.interval = self.settings["keyframe_interval"]
+        self.tracker.motion_threshold = self.settings["motion_threshold"]
+
+    def open(self):
+        cap = cv2.VideoCapture(self.uri)
+        if not cap.isOpened():
+            raise IOError("Impossible d'ouvrir la source {}".format(self.name))
+        if self.capture_size and not self.is_file:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.capture_size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.capture_size[1])
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        return cap
+
+    def stats(self):
+        return {
+            "captured_frames": self.captured_frames,
+            "processed_frames": self.processed_frames,
+            "dropped_frames": self.dropped_frames,
+            "finished": self.finished,
+            "tracking": self.tracker.stats(),
+        }
+
+
+class MultiSourceEngine:
+    # Un thread de capture par source (lecture bloquante), workers threads
+    # de traitement partagés. Une source n'est traitée que par un thread à la
+    # fois, dans l'ordre de ses images (son tracker en dépend) ; les sources
+    # prêtes sont servies à tour de rôle, aucune ne peut affamer les autres.
+    # Les images rendues sont publiées aux abonnés de chaque source, et à la
+    # grille composite si elle est demandée.
+    # inference_pool permet de partager un InferencePool existant ; sinon
+    # inference_workers processus sont lancés pour le moteur.
+    def __init__(self, sources, workers=None, inference_workers=0, inference_pool=None,
+                 grid=False, grid_size=GRID_SIZE, grid_fps=GRID_FPS):
+        self.sources = list(sources)
+        names = [source.name for source in self.sources]
+        if len(set(names)) != len(names) or "grid" in names:
+            raise ValueError("Chaque source doit avoir un nom unique (et différent de grid)")
+        self.workers = workers or min(len(self.sources), os.cpu_count() or 1)
+        self.inference_pool = inference_pool
+        self._owns_pool = inference_pool is None and bool(inference_workers)
+        if self._owns_pool:
+            self.inference_pool = InferencePool(inference_workers)
+        self.grid = grid
+        self.grid_size = grid_size
+        self.grid_fps = grid_fps
+        self._ready = deque()
+        self._condition = threading.Condition()
+        self._subscribers = {}
+        self._subscribers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def source(self, name):
+        for source in self.sources:
+            if source.name == name:
+                return source
+        raise KeyError(name)
+
+    def subscribe(self, name, maxsize=2, lossless=False):
+        # File des images rendues d'une source, ou de la grille (name "grid").
+        # Une file lossless ne perd rien : le traitement attend le lecteur.
+        if lossless:
+            subscriber = queue.Queue(maxsize)
+        else:
+            subscriber = LatestQueue(maxsize, name="engine:{}".format(name))
+        with self._subscribers_lock:
+            self._subscribers[name] = self._subscribers.get(name, ()) + (subscriber,)
+        return subscriber
+
+    def unsubscribe(self, name, subscriber):
+        with self._subscribers_lock:
+            self._subscribers[name] = tuple(
+                s for s in self._subscribers.get(name, ()) if s is not subscriber)
+
+    def start(self):
+        for source in self.sources:
+            self._spawn(self._capture, source, name="capture:{}".format(source.name))
+        for index in range(self.workers):
+            self._spawn(self._process, name="process-{}".format(index))
+        if self.grid:
+            self._spawn(self._composite, name="grid")
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for source in self.sources:
+            source._consumed.set()
+        for thread in self._threads:
+            thread.join()
+        if self._owns_pool:
+            self.inference_pool.close()
+
+    def wait(self, timeout=None):
+        # Attend la fin de toutes les sources (fichiers non bouclés)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop_event.is_set():
+            with self._condition:
+                if all(source.finished for source in self.sources) and not any(
+                        source.busy or source.pending is not None for source in self.sources):
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return False
+
+    def stats(self):
+        return {source.name: source.stats() for source in self.sources}
+
+    def _spawn(self, target, *args, name=None):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _capture(self, source):
+        cap = None
+        try:
+            cap = source.open()
+            period = 1.0 / source.fps if source.is_file and source.realtime else 0
+            next_time = time.monotonic()
+            while not self._stop_event.is_set():
+                if not source.realtime:
+                    # Fichier traité image par image : on attend que la
+                    # précédente ait été prise
+                    source._consumed.wait()
+                    if self._stop_event.is_set():
+                        break
+                ret, frame = cap.read()
+                if not ret:
+                    if source.is_file and source.loop:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                source.captured_frames += 1
+                self._offer(source, frame)
+                if period:
+                    next_time += period
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_time = time.monotonic()
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._condition:
+                source.finished = True
+
+    def _offer(self, source, frame):
+        with self._condition:
+            if source.pending is not None:
+                source.dropped_frames += 1
+                metrics.count("dropped_frames", "capture:{}".format(source.name))
+            source.pending = frame
+            source._consumed.clear()
+            if not source.busy and source not in self._ready:
+                self._ready.append(source)
+                self._condition.notify()
+
+    def _process(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._stop_event.is_set():
+                    self._condition.wait()
+                if self._stop_event.is_set():
+                    return
+                source = self._ready.popleft()
+                frame, source.pending = source.pending, None
+                source.busy = True
+            source._consumed.set()
+            try:
+                self._render(source, frame)
+            finally:
+                with self._condition:
+                    source.busy = False
+                    if source.pending is not None:
+                        self._ready.append(source)
+                        self._condition.notify()
+
+    def _render(self, source, frame):
+        settings = source.settings
+        chain = source.chain
+
+        def infer(frame, needs):
+            if self.inference_pool is not None:
+                try:
+                    return self.inference_pool.infer(
+                        frame, needs, inference_width=settings["inference_width"])
+                except (TimeoutError, RuntimeError):
+                    # Worker perdu ou en échec : le tracker propage les points
+                    metrics.count("inference_failures", source.name)
+                    return None
+            return run_inference(frame, needs, use_holistic=False,
+                                 inference_width=settings["inference_width"])
+
+        with metrics.time("source", source.name):
+            results = source.tracker.process(frame, chain.needs, infer)
+            frame = chain(frame, results)
+        source.processed_frames += 1
+        source.latest = frame
+        metrics.tick(source.name)
+        self._publish(source.name, frame)
+
+    def _publish(self, name, frame):
+        for subscriber in self._subscribers.get(name, ()):
+            subscriber.put(frame)
+
+    def _composite(self):
+        # Dernière image de chaque source dans sa case, à cadence fixe : une
+        # source lente ou arrêtée garde sa dernière image sans ralentir les
+        # autres
+        width, height = self.grid_size
+        count = len(self.sources)
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+        tile_width, tile_height = width // columns, height // rows
+        period = 1.0 / self.grid_fps
+        while not self._stop_event.wait(period):
+            canvas = np.zeros((height, width, 3), dtype=np.uint8)
+            for index, source in enumerate(self.sources):
+                frame = source.latest
+                x = (index % columns) * tile_width
+                y = (index // columns) * tile_height
+                if frame is not None:
+                    place_tile(canvas[y:y + tile_height, x:x + tile_width], frame)
+                cv2.putText(canvas, source.name, (x + 8, y + 24), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.6, (255, 255, 255), 1, cv2.LINE_AA)
+            self._publish("grid", canvas)
+
+
+def place_tile(tile, frame):
+    # Image réduite dans la case en gardant ses proportions, centrée
+    tile_height, tile_width = tile.shape[:2]
+    height, width = frame.shape[:2]
+    scale = min(tile_width / width, tile_height / height)
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    x = (tile_width - size[0]) // 2
+    y = (tile_height - size[1]) // 2
+    cv2.resize(frame, size, dst=tile[y:y + size[1], x:x + size[0]],
+               interpolation=cv2.INTER_AREA)
+
+
+def record(engine, name, subscriber, filename, fps, frame_size, stop_event):
+    # Enregistre les images publiées sous name. Après stop_event, les images
+    # encore en file sont écrites.
+    lossless = isinstance(subscriber, queue.Queue)
+    if lossless:
+        # Chaque image à son tour, sans recaler sur l'horloge
+        recorder = None
+        writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"XVID"), fps, frame_size)
+    else:
+        recorder = AsyncRecorder(filename, fps, frame_size)
+    try:
+        while True:
+            try:
+                frame = subscriber.get(timeout=0.1)
+            except queue.Empty:
+                if stop_event.is_set():
+                    break
+                continue
+            if recorder is not None:
+                recorder.write(frame)
+            else:
+                if (frame.shape[1], frame.shape[0]) != frame_size:
+                    frame = cv2.resize(frame, frame_size)
+                writer.write(frame)
+    finally:
+        engine.unsubscribe(name, subscriber)
+        if recorder is not None:
+            recorder.close(wait=True)
+        else:
+            writer.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Applique des effets à plusieurs caméras ou vidéos dans un seul processus")
+    parser.add_argument("sources", nargs="+",
+                        help="index de caméra, fichier vidéo ou URL (rtsp://...)")
+    parser.add_argument("--effects", nargs="+", default=None,
+                        help="effets appliqués à toutes les sources")
+    parser.add_argument("--settings",
+                        help="fichier JSON : réglages communs (objet) ou par source (liste)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        metavar="CLE=VALEUR", help="réglage commun, par ex. keyframe_interval=3")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads de traitement (par défaut : un par source, au plus un par cœur)")
+    parser.add_argument("--inference-workers", type=int, default=0,
+                        help="processus d'inférence partagés (0 : dans ce processus)")
+    parser.add_argument("--output-dir", help="enregistre chaque source dans ce dossier")
+    parser.add_argument("--grid", metavar="FICHIER", help="enregistre la grille composite")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="durée en secondes (par défaut : jusqu'à la fin des fichiers)")
+    parser.add_argument("--loop", action="store_true", help="relit les fichiers en boucle")
+    parser.add_argument("--all-frames", action="store_true",
+                        help="traite chaque image des fichiers au lieu de suivre leur cadence")
+    args = parser.parse_args(argv)
+
+    common = {}
+    per_source = [{} for _ in args.sources]
+    if args.settings:
+        with open(args.settings) as settings_file:
+            loaded = json.load(settings_file)
+        if isinstance(loaded, list):
+            per_source = [dict(values) for values in loaded]
+            per_source += [{} for _ in range(len(args.sources) - len(per_source))]
+        else:
+            common.update(loaded)
+    common.update(parse_setting(text) for text in args.overrides)
+    if args.effects is not None:
+        common["selected_effects"] = args.effects
+
+    # Une même source peut être donnée deux fois (réglages différents)
+    names = [uri if args.sources.count(uri) == 1 else "{}#{}".format(uri, index)
+             for index, uri in enumerate(args.sources)]
+    sources = [Source(parse_source(uri), name=name, settings=dict(common, **overrides),
+                      loop=args.loop, realtime=not args.all_frames)
+               for uri, name, overrides in zip(args.sources, names, per_source)]
+    engine = MultiSourceEngine(sources, workers=args.workers,
+                               inference_workers=args.inference_workers,
+                               grid=bool(args.grid))
+
+    stop_event = threading.Event()
+    recorders = []
+    for source in sources:
+        # Taille et cadence connues avant le démarrage des captures
+        source.open().release()
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            filename = os.path.join(args.output_dir, "{:02d}.avi".format(len(recorders)))
+            recorders.append(threading.Thread(
+                target=record, args=(engine, source.name,
+                                     engine.subscribe(source.name, 8, lossless=args.all_frames),
+                                     filename, source.fps, source.frame_size, stop_event)))
+    if args.grid:
+        recorders.append(threading.Thread(
+            target=record, args=(engine, "grid", engine.subscribe("grid", 8), args.grid,
+                                 GRID_FPS, GRID_SIZE, stop_event)))
+    for thread in recorders:
+        thread.start()
+
+    start = time.monotonic()
+    engine.start()
+    try:
+        engine.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.monotonic() - start
+    engine.stop()
+    stop_event.set()
+    for thread in recorders:
+        thread.join()
+
+    for name, stats in engine.stats().items():
+        print("{} : {} images traitées ({:.1f} images/s), {} perdues".format(
+            name, stats["processed_frames"], stats["processed_frames"] / elapsed,
+            stats["dropped_frames"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
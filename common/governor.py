@@ -0,0 +1,196 @@
+import threading
+
+from common.models import DEFAULT_OPTIONS, models
+
+
+# Paliers de qualité, du meilleur au plus léger. Chaque palier dégrade un
+# réglage de plus, dans l'ordre : résolution d'inférence, complexité des
+# modèles MediaPipe, taille des noyaux de flou (Blur, Background
+# Distortion, Cartoon), puis densité des points dessinés. None : le réglage
+# de l'utilisateur (ou l'option par défaut du modèle) n'est pas touché.
+TIERS = [
+    {"inference_width": None, "model_complexity": None, "kernel_scale": 1.0, "splat_step": 1},
+    {"inference_width": 480, "model_complexity": 1, "kernel_scale": 1.0, "splat_step": 1},
+    {"inference_width": 320, "model_complexity": 1, "kernel_scale": 1.0, "splat_step": 1},
+    {"inference_width": 320, "model_complexity": 0, "kernel_scale": 1.0, "splat_step": 1},
+    {"inference_width": 320, "model_complexity": 0, "kernel_scale": 0.5, "splat_step": 1},
+    {"inference_width": 320, "model_complexity": 0, "kernel_scale": 0.5, "splat_step": 2},
+]
+
+# Modèles qui ont une option model_complexity (Hands n'accepte que 0 ou 1)
+COMPLEXITY_MODELS = {"pose": 2, "holistic": 2, "hands": 1}
+
+
+def apply_tier(settings, tier):
+    # Réglages d'effets effectifs : ceux de l'utilisateur, plafonnés par le
+    # palier
+    settings = dict(settings)
+    if "inference_width" in settings:
+        settings["inference_width"] = cap_width(settings["inference_width"], tier)
+    settings["kernel_scale"] = tier["kernel_scale"]
+    settings["splat_step"] = tier["splat_step"]
+    return settings
+
+
+def cap_width(inference_width, tier):
+    if tier["inference_width"] is None:
+        return inference_width
+    return min(inference_width, tier["inference_width"])
+
+
+def configure_models(tier, manager=models):
+    # Un graphe déjà chargé est reconstruit tout de suite, l'ancien servant
+    # jusqu'à ce que le nouveau soit prêt. Une complexité dont le modèle n'est
+    # pas installé (voir models.model_available) est ignorée : le graphe
+    # garde la sienne.
+    for kind, highest in COMPLEXITY_MODELS.items():
+        complexity = tier["model_complexity"]
+        if complexity is None:
+            complexity = DEFAULT_OPTIONS.get(kind, {}).get("model_complexity", highest)
+        manager.configure(kind, model_complexity=min(complexity, highest))
+
+
+class QualityGovernor:
+    # Compare le temps par image mesuré au budget 1 / target_fps. Au-delà du
+    # budget, on descend d'un palier ; sous up_margin du budget, on remonte.
+    # L'écart entre les deux seuils et l'attente de hold_frames images après
+    # chaque changement évitent les allers-retours. Une remontée suivie
+    # d'une redescente rapide double l'attente avant la prochaine remontée.
+    #
+    # Les étages mesurés sont lissés séparément : dans un pipeline, le temps
+    # par image est celui de l'étage le plus lent ; dans une boucle unique
+    # (pipelined=False), la somme des étages.
+    #
+    # Sans target_fps, le gouverneur est désactivé : il reste au premier
+    # palier, qui ne change aucun réglage.
+    def __init__(self, target_fps=None, tiers=TIERS, pipelined=True,
+                 smoothing=0.1, down_margin=1.0, up_margin=0.7, hold_frames=30,
+                 max_hold_frames=960):
+        self.target_fps = target_fps
+        self.tiers = tiers
+        self.pipelined = pipelined
+        self.enabled = target_fps is not None
+        self.smoothing = smoothing
+        self.down_margin = down_margin
+        self.up_margin = up_margin
+        self.hold_frames = hold_frames
+        self.max_hold_frames = max_hold_frames
+        self.tier = 0
+        self.changes = 0
+        self._averages = {}
+        self._frames = 0
+        self._up_hold = hold_frames
+        self._last_change = None
+        self._lock = threading.Lock()
+        self._configure_lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            average = self._averages.get(stage)
+            if average is None:
+                self._averages[stage] = seconds
+            else:
+                self._averages[stage] = average + self.smoothing * (seconds - average)
+
+    def frame_time(self):
+        with self._lock:
+            values = list(self._averages.values())
+        if not values:
+            return None
+        return max(values) if self.pipelined else sum(values)
+
+    def update(self):
+        # Appelé une fois par image produite ; renvoie True si le palier a
+        # changé (les réglages de settings() sont alors à appliquer)
+        if not self.enabled:
+            return False
+        self._frames += 1
+        frame_time = self.frame_time()
+        if frame_time is None or self._frames < self.hold_frames:
+            return False
+        budget = 1.0 / self.target_fps
+        if frame_time > budget * self.down_margin and self.tier < len(self.tiers) - 1:
+            if self._last_change == "up" and self._frames < 2 * self._up_hold:
+                # Le palier supérieur ne tient pas : on attendra plus longtemps
+                self._up_hold = min(self._up_hold * 2, self.max_hold_frames)
+            self._change(+1)
+            return True
+        if (frame_time < budget * self.up_margin and self.tier > 0
+                and self._frames >= self._up_hold):
+            self._change(-1)
+            return True
+        if self._frames >= 4 * self._up_hold:
+            # Palier stable depuis longtemps : on retrouve l'attente normale
+            self._up_hold = self.hold_frames
+        return False
+
+    def _change(self, step):
+        self.tier += step
+        self.changes += 1
+        self._last_change = "down" if step > 0 else "up"
+        self._frames = 0
+        # Les mesures précédentes ne valent plus pour le nouveau palier
+        with self._lock:
+            self._averages.clear()
+
+    def reset(self):
+        self.tier = 0
+        self._frames = 0
+        self._up_hold = self.hold_frames
+        self._last_change = None
+        with self._lock:
+            self._averages.clear()
+
+    def settings(self):
+        return dict(self.tiers[self.tier])
+
+    def apply(self, settings):
+        return apply_tier(settings, self.tiers[self.tier])
+
+    def configure_models(self, manager=models, background=True):
+        # La reconstruction des graphes se fait hors du chemin des images.
+        # Chaque thread applique le palier courant au moment où il obtient le
+        # verrou : après plusieurs changements rapprochés, le dernier gagne.
+        if not background:
+            self._configure_models(manager)
+            return None
+        thread = threading.Thread(target=self._configure_models, args=(manager,),
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def _configure_models(self, manager):
+        with self._configure_lock:
+            configure_models(self.tiers[self.tier], manager)
+
+    def stats(self):
+        frame_time = self.frame_time()
+        return {
+            "enabled": self.enabled,
+            "tier": self.tier,
+            "tiers": len(self.tiers),
+            "target_fps": self.target_fps,
+            "frame_ms": None if frame_time is None else frame_time * 1000,
+            "changes": self.changes,
+            "settings": self.settings(),
+        }
+
+    def prometheus(self, prefix="video"):
+        # Jauges au format texte de Prometheus, à la suite de metrics.prometheus()
+        lines = ["# TYPE {}_quality_tier gauge".format(prefix),
+                 "{}_quality_tier {}".format(prefix, self.tier)]
+        if self.enabled:
+            lines += ["# TYPE {}_quality_target_fps gauge".format(prefix),
+                      "{}_quality_target_fps {}".format(prefix, self.target_fps)]
+        return "\n".join(lines) + "\n"
+
+    def describe(self):
+        # Texte court pour l'interface
+        if not self.enabled:
+            return "Quality: fixed"
+        if self.tier == 0:
+            return "Quality {}/{} : full".format(self.tier + 1, len(self.tiers))
+        tier = self.tiers[self.tier]
+        return "Quality {}/{} : {} px, complexity {}, kernels x{:g}, points 1/{}".format(
+            self.tier + 1, len(self.tiers), tier["inference_width"],
+            tier["model_complexity"], tier["kernel_scale"], tier["splat_step"])
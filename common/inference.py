@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+
+from common.models import models
+
+
+def landmarks_to_array(landmarks):
+    # Seul parcours des points protobuf de MediaPipe
+    if landmarks is None:
+        return None
+    return np.array([(point.x, point.y, point.z) for point in landmarks.landmark],
+                    dtype=np.float32)
+
+
+class InferenceResults:
+    # Points de repère d'une image, quel que soit le modèle utilisé : tableaux
+    # (N, 3) float32 de coordonnées normalisées (x, y, z) pour la pose, chaque
+    # visage et chaque main. Les effets lisent ces tableaux, les protobufs de
+    # MediaPipe ne sont parcourus qu'une fois par image.
+    # segmentation_mask est la probabilité (0..1) d'appartenir à une personne, à
+    # la résolution d'inférence.
+    def __init__(self, pose=None, faces=None, left_hand=None, right_hand=None,
+                 hands=None, segmentation_mask=None):
+        self.pose = pose
+        self.faces = faces or []
+        self.left_hand = left_hand
+        self.right_hand = right_hand
+        if hands is None:
+            hands = [hand for hand in (left_hand, right_hand) if hand is not None]
+        self.hands = hands
+        self.segmentation_mask = segmentation_mask
+        # Faux quand les points ont été propagés depuis la dernière détection
+        self.detected = True
+        self._pixels = {}
+
+    @property
+    def face(self):
+        if self.faces:
+            return self.faces[0]
+        return None
+
+    def pixels(self, points, size):
+        # Coordonnées entières (x, y) des points sur une image de taille
+        # (largeur, hauteur), calculées une seule fois pour tous les effets
+        key = (id(points), size)
+        pixels = self._pixels.get(key)
+        if pixels is None:
+            pixels = (points[:, :2] * np.array(size, dtype=np.float64)).astype(np.int32)
+            self._pixels[key] = pixels
+        return pixels
+
+
+def model_kinds(needs, use_holistic=True):
+    kinds = [kind for kind in ("pose", "face", "hands") if kind in needs]
+    if use_holistic and len(kinds) > 1:
+        kinds = ["holistic"]
+    # La segmentation a toujours son propre modèle, bien plus léger
+    if "segmentation" in needs:
+        kinds.append("segmentation")
+    return kinds
+
+
+def prepare_input(frame, inference_width=None):
+    # Seule une copie RGB réduite est envoyée aux modèles : les points sont
+    # normalisés (0..1), ils se replacent donc tels quels sur l'image pleine
+    # résolution tant que le rapport largeur/hauteur est conservé
+    height, width = frame.shape[:2]
+    if inference_width and width > inference_width:
+        size = (inference_width, max(1, round(height * inference_width / width)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def run_inference(frame, needs, use_holistic=True, manager=models, inference_width=None):
+    if not needs:
+        return InferenceResults()
+
+    rgb_frame = prepare_input(frame, inference_width)
+    fields = {}
+    for kind in model_kinds(needs, use_holistic):
+        fields.update(process_kind(kind, rgb_frame, manager))
+    return InferenceResults(**fields)
+
+
+def process_kind(kind, rgb_frame, manager=models):
+    # Champs de InferenceResults produits par un modèle. Les modèles dédiés
+    # sont bien plus légers que Holistic et peuvent tourner en parallèle
+    # (voir common.workers).
+    if kind == "segmentation":
+        return {"segmentation_mask": manager.process("segmentation", rgb_frame).segmentation_mask}
+
+    if kind == "holistic":
+        results = manager.process("holistic", rgb_frame)
+        return {
+            "pose": landmarks_to_array(results.pose_landmarks),
+            "faces": [landmarks_to_array(results.face_landmarks)] if results.face_landmarks else None,
+            "left_hand": landmarks_to_array(results.left_hand_landmarks),
+            "right_hand": landmarks_to_array(results.right_hand_landmarks),
+        }
+
+    if kind == "pose":
+        return {"pose": landmarks_to_array(manager.process("pose", rgb_frame).pose_landmarks)}
+
+    if kind == "face":
+        multi_face_landmarks = manager.process("face", rgb_frame).multi_face_landmarks
+        return {"faces": [landmarks_to_array(face) for face in multi_face_landmarks or []]}
+
+    if kind == "hands":
+        results = manager.process("hands", rgb_frame)
+        left_hand = right_hand = None
+        hands = []
+        for hand_landmarks, handedness in zip(results.multi_hand_landmarks or [],
+                                              results.multi_handedness or []):
+            hand = landmarks_to_array(hand_landmarks)
+            hands.append(hand)
+            # Hands suppose une image en miroir, contrairement à Holistic :
+            # son étiquette "Left" correspond donc à la main droite
+            if handedness.classification[0].label == "Left":
+                right_hand = hand
+            else:
+                left_hand = hand
+        return {"left_hand": left_hand, "right_hand": right_hand, "hands": hands}
+
+    raise ValueError("Modèle inconnu : {}".format(kind))
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from common.pipeline import BufferPool
+
+
+# Tables 3D déjà calculées, par suite d'effets et de réglages
+MAX_CACHED_TABLES = 2
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def run_steps(steps, frame, out=None):
+    for step in steps:
+        frame = step(frame, None)
+    if out is not None:
+        np.copyto(out, frame)
+        return out
+    return frame
+
+
+def channel_lut(steps):
+    # Rampe 0..255 sur les trois canaux : pour des effets canal par canal, la
+    # sortie est directement la table (256, 1, 3) de cv2.LUT
+    ramp = np.repeat(np.arange(256, dtype=np.uint8)[:, None, None], 3, axis=2)
+    return run_steps(steps, ramp.copy())
+
+
+class ChannelLUTStep:
+    # Suite d'effets canal par canal (luminosité, contraste...) en un seul
+    # cv2.LUT
+    def __init__(self, steps):
+        lut = channel_lut(steps)
+        # Une table commune aux trois canaux est nettement plus rapide
+        if (lut[:, :, 1:] == lut[:, :, :1]).all():
+            lut = np.ascontiguousarray(lut[:, :, 0])
+        self.lut = lut
+
+    def is_identity(self):
+        return bool((self.lut.reshape(256, -1) == np.arange(256)[:, None]).all())
+
+    def __call__(self, frame, results, out=None):
+        return cv2.LUT(frame, self.lut, dst=out)
+
+
+def color_cube(first_row=0, rows=4096):
+    # Toutes les couleurs 24 bits dans une image 4096x4096 : le pixel d'indice
+    # b | g << 8 | r << 16 vaut (b, g, r). first_row et rows n'en donnent
+    # qu'une bande.
+    index = np.arange(first_row << 12, (first_row + rows) << 12, dtype=np.uint32)
+    cube = np.empty((rows << 12, 3), dtype=np.uint8)
+    cube[:, 0] = index & 0xFF
+    cube[:, 1] = (index >> 8) & 0xFF
+    cube[:, 2] = index >> 16
+    return cube.reshape(rows, 4096, 3)
+
+
+# Lignes du cube traitées à la fois : la construction ne garde en mémoire
+# qu'une bande de 1M couleurs en plus de la table
+BUILD_ROWS = 256
+
+
+def build_color_table(steps):
+    # Les effets de couleur ne dépendent que de la couleur du pixel : le cube
+    # peut être traité par bandes
+    table = np.empty((4096, 4096), dtype=np.uint32)
+    bgra = np.empty((BUILD_ROWS, 4096, 4), dtype=np.uint8)
+    for first_row in range(0, 4096, BUILD_ROWS):
+        band = run_steps(steps, color_cube(first_row, BUILD_ROWS))
+        cv2.cvtColor(band, cv2.COLOR_BGR2BGRA, dst=bgra)
+        table[first_row:first_row + BUILD_ROWS] = bgra.view(np.uint32)[:, :, 0]
+    return table.reshape(-1)
+
+
+class ColorTable:
+    # Table d'une suite d'effets, prête ou en cours de construction. Toutes
+    # les étapes de même clé partagent la même : une seule construction,
+    # même si la chaîne est recompilée plusieurs fois pendant qu'elle tourne.
+    def __init__(self, steps):
+        self.table = None
+        self.ready = threading.Event()
+        threading.Thread(target=self._build, args=(steps,), daemon=True).start()
+
+    def _build(self, steps):
+        self.table = build_color_table(steps)
+        self.ready.set()
+
+
+def color_table(steps, key):
+    with _tables_lock:
+        entry = _tables.get(key)
+        if entry is None:
+            entry = _tables[key] = ColorTable(steps)
+            while len(_tables) > MAX_CACHED_TABLES:
+                _tables.popitem(last=False)
+        else:
+            _tables.move_to_end(key)
+    return entry
+
+
+class ColorLUTStep:
+    # Suite d'effets de couleur quelconques (teinte, saturation, sépia...)
+    # fusionnée en une table 3D exacte de 2^24 couleurs, appliquée en une
+    # seule lecture par pixel. La table est calculée en arrière-plan (quelques
+    # centaines de ms) ; en attendant, les effets sont appliqués un par un.
+    def __init__(self, steps, key):
+        self.steps = steps
+        self.key = key
+        self._entry = color_table(steps, key)
+        # Signalé quand la table est prête
+        self.ready = self._entry.ready
+        # Image BGRA intermédiaire et indices dans la table, réutilisés d'une
+        # frame à l'autre
+        self._bgra = BufferPool(1)
+        self._index = BufferPool(1)
+
+    @property
+    def table(self):
+        return self._entry.table
+
+    def __call__(self, frame, results, out=None):
+        table = self._entry.table
+        if table is None:
+            return run_steps(self.steps, frame, out)
+
+        height, width = frame.shape[:2]
+        bgra = self._bgra.acquire((height, width, 4))
+        cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=bgra)
+        pixels = bgra.view(np.uint32).reshape(height, width)
+        # On ignore l'octet alpha pour obtenir b | g << 8 | r << 16. Des
+        # indices déjà en intp et mode="clip" (ils sont toujours dans la
+        # table) : np.take écrit directement dans pixels, sans conversion
+        # ni copie intermédiaire.
+        index = self._index.acquire((height, width), np.intp)
+        np.bitwise_and(pixels, 0xFFFFFF, out=index)
+        np.take(table, index, out=pixels, mode="clip")
+        out = cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+        self._index.release(index)
+        self._bgra.release(bgra)
+        return out
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+# Fenêtre glissante des histogrammes et du calcul des fps
+WINDOW = 300
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, kind, name):
+        self.metrics = metrics
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.kind, self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    # Durées par étage ("stage"), par effet ("effect") et par modèle
+    # ("model"), cadence atteinte et images perdues. Désactivé, chaque point
+    # de mesure se résume à un test de `enabled`.
+    def __init__(self, enabled=False, window=WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._durations = {}
+        self._totals = {}
+        self._ticks = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def time(self, kind, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, kind, name)
+
+    def observe(self, kind, name, seconds):
+        if not self.enabled:
+            return
+        key = (kind, name)
+        with self._lock:
+            durations = self._durations.get(key)
+            if durations is None:
+                durations = self._durations[key] = deque(maxlen=self.window)
+                self._totals[key] = [0, 0.0]
+            durations.append(seconds)
+            total = self._totals[key]
+            total[0] += 1
+            total[1] += seconds
+
+    def tick(self, name):
+        # Une image sortie de name : sert au calcul des fps
+        if not self.enabled:
+            return
+        with self._lock:
+            ticks = self._ticks.get(name)
+            if ticks is None:
+                ticks = self._ticks[name] = deque(maxlen=self.window)
+            ticks.append(time.monotonic())
+
+    def count(self, name, label, value=1):
+        if not self.enabled:
+            return
+        key = (name, label)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+            self._ticks.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            durations = {key: np.array(values) for key, values in self._durations.items()}
+            totals = {key: tuple(value) for key, value in self._totals.items()}
+            ticks = {name: list(values) for name, values in self._ticks.items()}
+            counters = dict(self._counters)
+
+        snapshot = {"durations": {}, "fps": {}, "counters": {}}
+        for (kind, name), values in durations.items():
+            count, total = totals[(kind, name)]
+            summary = {"count": count, "sum": total}
+            if len(values):
+                for quantile, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                    summary[quantile] = float(value)
+            snapshot["durations"].setdefault(kind, {})[name] = summary
+        for name, values in ticks.items():
+            if len(values) > 1 and values[-1] > values[0]:
+                snapshot["fps"][name] = (len(values) - 1) / (values[-1] - values[0])
+        for (name, label), value in counters.items():
+            snapshot["counters"].setdefault(name, {})[label] = value
+        return snapshot
+
+    def prometheus(self, prefix="video"):
+        # Format texte de Prometheus : un résumé (summary) par type de durée
+        snapshot = self.snapshot()
+        lines = []
+        for kind, names in sorted(snapshot["durations"].items()):
+            metric = "{}_{}_seconds".format(prefix, kind)
+            lines.append("# TYPE {} summary".format(metric))
+            for name, summary in sorted(names.items()):
+                label = '{}="{}"'.format(kind, _escape(name))
+                for quantile in QUANTILES:
+                    if quantile in summary:
+                        lines.append('{}{{{},quantile="{}"}} {:.6f}'.format(
+                            metric, label, quantile, summary[quantile]))
+                lines.append("{}_sum{{{}}} {:.6f}".format(metric, label, summary["sum"]))
+                lines.append("{}_count{{{}}} {}".format(metric, label, summary["count"]))
+        if snapshot["fps"]:
+            metric = "{}_fps".format(prefix)
+            lines.append("# TYPE {} gauge".format(metric))
+            for name, fps in sorted(snapshot["fps"].items()):
+                lines.append('{}{{stage="{}"}} {:.3f}'.format(metric, _escape(name), fps))
+        for name, labels in sorted(snapshot["counters"].items()):
+            metric = "{}_{}_total".format(prefix, name)
+            lines.append("# TYPE {} counter".format(metric))
+            for label, value in sorted(labels.items()):
+                lines.append('{}{{queue="{}"}} {}'.format(metric, _escape(label), value))
+        return "\n".join(lines) + "\n"
+
+    def summary_text(self):
+        # Texte court pour un affichage à l'écran
+        snapshot = self.snapshot()
+        lines = ["{} {:.1f} fps".format(name, fps)
+                 for name, fps in sorted(snapshot["fps"].items())]
+        for kind, names in sorted(snapshot["durations"].items()):
+            for name, summary in sorted(names.items()):
+                if 0.5 in summary:
+                    lines.append("{} {}: p50 {:.1f} / p95 {:.1f} / p99 {:.1f} ms".format(
+                        kind, name, summary[0.5] * 1000, summary[0.95] * 1000,
+                        summary[0.99] * 1000))
+        for name, labels in sorted(snapshot["counters"].items()):
+            for label, value in sorted(labels.items()):
+                lines.append("{} {}: {}".format(name, label, value))
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
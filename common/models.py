@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+
+import numpy as np
+import mediapipe as mp
+
+from common.metrics import metrics
+
+
+# Options par défaut de chaque graphe MediaPipe, modifiables avec configure()
+DEFAULT_OPTIONS = {
+    "pose": {"model_complexity": 1},
+    "face": {"max_num_faces": 1},
+    "hands": {"max_num_hands": 2},
+    "holistic": {"model_complexity": 1},
+    # Modèle paysage (256x144), le plus rapide
+    "segmentation": {"model_selection": 1},
+}
+
+# Modèles de points de Pose et Holistic selon model_complexity. Seul le
+# modèle full est dans le paquet mediapipe : les autres sont téléchargés par
+# MediaPipe à la construction du graphe s'ils manquent.
+POSE_LANDMARK_MODELS = {
+    0: "pose_landmark_lite.tflite",
+    1: "pose_landmark_full.tflite",
+    2: "pose_landmark_heavy.tflite",
+}
+MEDIAPIPE_DIR = os.path.dirname(os.path.abspath(mp.__file__))
+
+logger = logging.getLogger(__name__)
+
+_FACTORIES = {
+    "pose": lambda options: mp.solutions.pose.Pose(**options),
+    "face": lambda options: mp.solutions.face_mesh.FaceMesh(**options),
+    "hands": lambda options: mp.solutions.hands.Hands(**options),
+    "holistic": lambda options: mp.solutions.holistic.Holistic(**options),
+    "segmentation": lambda options: mp.solutions.selfie_segmentation.SelfieSegmentation(**options),
+}
+
+
+def model_available(kind, options):
+    # Vrai si le graphe se construit sans rien télécharger
+    if kind not in ("pose", "holistic"):
+        return True
+    name = POSE_LANDMARK_MODELS.get(options.get("model_complexity", 1))
+    return name is not None and os.path.exists(
+        os.path.join(MEDIAPIPE_DIR, "modules", "pose_landmark", name))
+
+
+class ModelManager:
+    # Les graphes ne sont construits qu'à leur première utilisation, puis
+    # partagés par tout le processus. Un graphe MediaPipe n'est pas
+    # réentrant : process() sérialise les appels sur un même modèle.
+    def __init__(self, options=None):
+        self._options = {kind: dict(values)
+                         for kind, values in DEFAULT_OPTIONS.items()}
+        for kind, values in (options or {}).items():
+            self._options[kind].update(values)
+        self._models = {}
+        # Dernières options avec lesquelles chaque graphe a été construit
+        self._built_options = {}
+        self._build_lock = threading.Lock()
+        self._configure_lock = threading.Lock()
+        self._process_locks = {kind: threading.Lock() for kind in _FACTORIES}
+
+    def options(self, kind):
+        return dict(self._options[kind])
+
+    def configure(self, kind, **options):
+        # Un graphe déjà construit n'est remplacé qu'une fois le nouveau prêt :
+        # il sert jusque-là, et reste en place si la construction échoue.
+        # Renvoie False si les options n'ont pas été appliquées (modèle absent
+        # du paquet ou construction impossible).
+        with self._configure_lock:
+            new_options = dict(self._options[kind])
+            new_options.update(options)
+            if new_options == self._options[kind]:
+                return True
+            if not model_available(kind, new_options):
+                return False
+            model = None
+            if self.is_loaded(kind):
+                try:
+                    model = _FACTORIES[kind](new_options)
+                except Exception:
+                    logger.exception("Graphe %s non reconstruit avec %s", kind, new_options)
+                    return False
+            with self._build_lock:
+                self._options[kind] = new_options
+                previous = self._models.pop(kind, None)
+                if model is not None:
+                    self._models[kind] = model
+                    self._built_options[kind] = new_options
+        # Sinon, le graphe sera construit avec les nouvelles options au
+        # prochain appel
+        if previous is not None:
+            with self._process_locks[kind]:
+                previous.close()
+        return True
+
+    def is_loaded(self, kind):
+        return kind in self._models
+
+    def get(self, kind):
+        model = self._models.get(kind)
+        if model is None:
+            with self._build_lock:
+                model = self._models.get(kind)
+                if model is None:
+                    model = self._build(kind)
+                    self._models[kind] = model
+        return model
+
+    def _build(self, kind):
+        # Appelé sous _build_lock
+        options = self._options[kind]
+        try:
+            model = _FACTORIES[kind](options)
+        except Exception:
+            previous = self._built_options.get(kind)
+            if previous is None or previous == options:
+                raise
+            # Options refusées : on revient aux dernières qui ont fonctionné
+            logger.exception("Graphe %s non construit avec %s", kind, options)
+            self._options[kind] = options = previous
+            model = _FACTORIES[kind](options)
+        self._built_options[kind] = options
+        return model
+
+    def process(self, kind, rgb_frame):
+        with self._process_locks[kind], metrics.time("model", kind):
+            return self.get(kind).process(rgb_frame)
+
+    def warm_up(self, kinds, background=True):
+        # Une première inférence sur une image noire initialise le graphe,
+        # la première vraie image ne paie donc plus ce coût
+        def load():
+            blank = np.zeros((256, 256, 3), dtype=np.uint8)
+            for kind in kinds:
+                if not self.is_loaded(kind):
+                    self.process(kind, blank)
+
+        if not background:
+            load()
+            return None
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        with self._build_lock:
+            models, self._models = self._models, {}
+        for kind, model in models.items():
+            with self._process_locks[kind]:
+                model.close()
+
+
+models = ModelManager()
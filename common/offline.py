@@ -0,0 +1,211 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from common.effects import compile_chain, seed_glitch
+from common.inference import run_inference
+from common.tracking import KeyframeTracker
+
+
+# Traitement hors ligne d'un fichier vidéo, sans caméra ni interface :
+#   python -m common.offline entree.mp4 sortie.avi --effects "Face Mask" Rainbow
+# Les réglages ont la forme de effect_settings de la version Web.
+DEFAULT_SETTINGS = {
+    "selected_effects": [],
+    "keyframe_interval": 1,
+    "motion_threshold": 0,
+    "inference_width": 640,
+}
+
+# Codec sans perte des segments intermédiaires, réencodés une seule fois
+SEGMENT_FOURCC = "FFV1"
+# Nombre minimal d'images par segment, pour amortir l'ouverture et la
+# recherche dans la vidéo
+MIN_SEGMENT_FRAMES = 30
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError("Impossible d'ouvrir {}".format(path))
+    try:
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+    return frame_count, fps, size
+
+
+def split_segments(frame_count, workers, keyframe_interval=1):
+    # Bornes [début, fin) de chaque segment. Les débuts tombent sur une image
+    # de détection du tracker (multiple de keyframe_interval), pas sur une
+    # image clé du codec : chaque segment repart d'une inférence complète,
+    # comme le ferait un traitement continu. Le dernier segment va jusqu'à
+    # la fin réelle du fichier (fin None), le nombre d'images annoncé par le
+    # conteneur n'étant pas toujours exact.
+    interval = max(1, keyframe_interval)
+    if frame_count <= 0 or workers <= 1:
+        return [(0, None)]
+    # Quelques segments par worker pour équilibrer la charge
+    count = min(workers * 4, max(1, frame_count // MIN_SEGMENT_FRAMES))
+    length = -(-frame_count // count)
+    length = -(-length // interval) * interval
+    starts = list(range(0, frame_count, length))
+    return [(start, end) for start, end in zip(starts, starts[1:] + [None])]
+
+
+def render_segment(source, target, start, end, settings, fps, size, seed=None):
+    # Exécuté dans un worker : les modèles MediaPipe sont construits à la
+    # première image puis réutilisés pour tous les segments de ce processus
+    if seed is not None:
+        seed_glitch(seed + start)
+    chain = compile_chain(settings["selected_effects"], settings)
+    tracker = KeyframeTracker(interval=settings["keyframe_interval"],
+                              motion_threshold=settings["motion_threshold"])
+
+    def infer(frame, needs):
+        return run_inference(frame, needs, use_holistic=False,
+                             inference_width=settings["inference_width"])
+
+    cap = cv2.VideoCapture(source)
+    writer = cv2.VideoWriter(target, cv2.VideoWriter_fourcc(*SEGMENT_FOURCC), fps, size)
+    frames = 0
+    # Image lue et image rendue réutilisées d'une frame à l'autre : le
+    # writer a fini avec l'image rendue quand write() rend la main
+    frame = None
+    output = None
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        while end is None or start + frames < end:
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            results = tracker.process(frame, chain.needs, infer)
+            if output is None or output.shape != frame.shape:
+                output = np.empty_like(frame)
+            writer.write(chain(frame, results, out=output))
+            frames += 1
+    finally:
+        cap.release()
+        writer.release()
+    return frames
+
+
+def join_segments(paths, target, fourcc, fps, size):
+    writer = cv2.VideoWriter(target, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    if not writer.isOpened():
+        raise IOError("Impossible d'écrire {}".format(target))
+    frames = 0
+    try:
+        for path in paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+                frames += 1
+            cap.release()
+    finally:
+        writer.release()
+    return frames
+
+
+def render_video(source, target, settings, workers=None, fourcc="XVID", seed=None):
+    settings = dict(DEFAULT_SETTINGS, **settings)
+    frame_count, fps, size = video_info(source)
+    workers = workers or os.cpu_count() or 1
+    segments = split_segments(frame_count, workers, settings["keyframe_interval"])
+    # Jamais plus de processus que de segments
+    workers = min(workers, len(segments))
+
+    start_time = time.monotonic()
+    temp_dir = tempfile.mkdtemp(prefix="offline-")
+    try:
+        paths = [os.path.join(temp_dir, "segment{:05d}.avi".format(index))
+                 for index in range(len(segments))]
+        # spawn, comme InferencePool : MediaPipe et ses threads ne supportent
+        # pas fork
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(render_segment, source, path, start, end,
+                                       settings, fps, size, seed)
+                       for path, (start, end) in zip(paths, segments)]
+            # Les segments sont assemblés dans l'ordre, quel que soit leur
+            # ordre de fin
+            for future in futures:
+                future.result()
+        frames = join_segments(paths, target, fourcc, fps, size)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    elapsed = time.monotonic() - start_time
+    return {
+        "frames": frames,
+        "segments": len(segments),
+        "workers": workers,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def parse_setting(text):
+    key, _, value = text.partition("=")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Applique une chaîne d'effets à un fichier vidéo",
+        epilog="La vidéo est découpée en segments rendus en parallèle. Chaque "
+               "segment commence sur une image de détection du tracker (multiple "
+               "de keyframe_interval), pas sur une image clé du codec : le worker "
+               "s'y place par une recherche dans la vidéo.")
+    parser.add_argument("source", help="vidéo d'entrée")
+    parser.add_argument("target", help="vidéo de sortie")
+    parser.add_argument("--effects", nargs="+", default=None,
+                        help="effets à appliquer, dans l'ordre")
+    parser.add_argument("--settings", help="fichier JSON de réglages (forme effect_settings)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        metavar="CLE=VALEUR", help="réglage isolé, par ex. mirror_intensity=2")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="nombre de processus, au plus un par segment "
+                             "(par défaut : nombre de cœurs)")
+    parser.add_argument("--fourcc", default="XVID", help="codec de la vidéo de sortie")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="graine des effets aléatoires, pour un rendu reproductible")
+    args = parser.parse_args(argv)
+
+    settings = {}
+    if args.settings:
+        with open(args.settings) as settings_file:
+            settings.update(json.load(settings_file))
+    settings.update(parse_setting(text) for text in args.overrides)
+    if args.effects is not None:
+        settings["selected_effects"] = args.effects
+
+    stats = render_video(args.source, args.target, settings, workers=args.workers,
+                         fourcc=args.fourcc, seed=args.seed)
+    print("{frames} images en {seconds:.1f} s ({fps:.1f} images/s, "
+          "{segments} segments, {workers} workers)".format(**stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import logging
+import queue
+import threading
+
+import numpy as np
+
+from common.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LatestQueue:
+    # File bornée où l'image la plus récente gagne : quand elle est pleine,
+    # l'élément le plus ancien est jeté plutôt que de bloquer le producteur.
+    # name identifie la file dans les mesures d'images perdues. on_drop reçoit
+    # chaque élément jeté, par exemple pour rendre son tampon à un BufferPool.
+    def __init__(self, maxsize=1, name=None, on_drop=None):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.name = name
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.dropped += 1
+                if self.name:
+                    metrics.count("dropped_frames", self.name)
+                if self.on_drop is not None:
+                    self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class PipelineStage(threading.Thread):
+    # Un étage lit son entrée, applique func et pousse le résultat dans sa
+    # sortie. Sans entrée, func est appelée en boucle (source, ex. caméra).
+    # func peut renvoyer None pour ne rien transmettre. Une exception de func
+    # ne perd que l'image en cours : elle est journalisée, comptée parmi les
+    # images perdues de l'étage, et l'étage passe à la suivante.
+    def __init__(self, name, func, inbox, outbox, stop_event, poll_interval=0.1):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.errors = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.inbox is None:
+                    result = self.func()
+                else:
+                    try:
+                        item = self.inbox.get(timeout=self.poll_interval)
+                    except queue.Empty:
+                        continue
+                    result = self.func(item)
+            except Exception:
+                self.errors += 1
+                metrics.count("dropped_frames", self.name)
+                logger.exception("Étage %s : image perdue", self.name)
+                if self.inbox is None:
+                    # Source en échec : on ne boucle pas à pleine vitesse
+                    self.stop_event.wait(self.poll_interval)
+                continue
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+
+class BufferPool:
+    # Tampons préalloués, tous de la même forme, rendus avec release() et
+    # réutilisés au lieu d'allouer une image à chaque frame. Un changement de
+    # taille d'image remplace le jeu de tampons.
+    def __init__(self, count):
+        self.count = count
+        self._free = []
+        self._key = None
+        self._lock = threading.Lock()
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            if key != self._key:
+                self._key = key
+                self._free = [np.empty(shape, dtype) for _ in range(self.count)]
+            if self._free:
+                return self._free.pop()
+        # Tous les tampons sont pris : on dépanne avec un tampon de plus
+        return np.empty(shape, dtype)
+
+    def release(self, buffer):
+        with self._lock:
+            if (buffer.shape, buffer.dtype) == self._key and len(self._free) < self.count:
+                self._free.append(buffer)
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+
+import cv2
+
+
+class AsyncRecorder:
+    # L'écriture (codec + disque) se fait dans un thread dédié : write() ne
+    # bloque jamais l'affichage. Si la file est pleine, l'écriture ne suit
+    # plus : l'image est perdue et comptée dans dropped_frames. Les images
+    # sont placées sur une grille à fps constant d'après leur horodatage : un
+    # trou est comblé en répétant l'image précédente (duplicated_frames), deux
+    # images sur le même créneau n'en gardent qu'une (skipped_frames).
+    def __init__(self, filename, fps, frame_size, fourcc="XVID", queue_size=64):
+        self.filename = filename
+        self.fps = fps
+        self.frame_size = tuple(frame_size)
+        self.writer = cv2.VideoWriter(
+            filename, cv2.VideoWriter_fourcc(*fourcc), fps, self.frame_size)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.duplicated_frames = 0
+        self.skipped_frames = 0
+        self._lagging = False
+        self._closed = False
+        self._start_time = None
+        self._last_slot = -1
+        self._last_frame = None
+        self._thread = threading.Thread(target=self._run, name="recorder")
+        self._thread.start()
+
+    def is_opened(self):
+        return self.writer.isOpened()
+
+    def is_lagging(self):
+        return self._lagging or self.queue.qsize() > self.queue.maxsize // 2
+
+    def stats(self):
+        return {
+            "written": self.written_frames,
+            "dropped": self.dropped_frames,
+            "duplicated": self.duplicated_frames,
+            "skipped": self.skipped_frames,
+            "pending": self.queue.qsize(),
+            "lagging": self.is_lagging(),
+        }
+
+    def write(self, frame, timestamp=None):
+        if self._closed:
+            return False
+        if timestamp is None:
+            timestamp = time.monotonic()
+        try:
+            self.queue.put_nowait((frame, timestamp))
+        except queue.Full:
+            self.dropped_frames += 1
+            self._lagging = True
+            return False
+        self._lagging = False
+        return True
+
+    def close(self, wait=False):
+        # Les images déjà en file sont écrites avant de fermer le fichier
+        if not self._closed:
+            self._closed = True
+            self.queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                frame, timestamp = item
+                self._write(frame, timestamp)
+        finally:
+            self.writer.release()
+
+    def _write(self, frame, timestamp):
+        if self._start_time is None:
+            self._start_time = timestamp
+        slot = round((timestamp - self._start_time) * self.fps)
+        if slot <= self._last_slot:
+            self.skipped_frames += 1
+            return
+
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            frame = cv2.resize(frame, self.frame_size)
+        if self._last_frame is not None:
+            for _ in range(slot - self._last_slot - 1):
+                self.writer.write(self._last_frame)
+                self.duplicated_frames += 1
+        self.writer.write(frame)
+        self.written_frames += 1
+        self._last_slot = slot
+        self._last_frame = frame
@@ -0,0 +1,62 @@
+import functools
+
+import cv2
+import numpy as np
+
+
+@functools.lru_cache(maxsize=32)
+def disc_offsets(radius):
+    # Décalages (dy, dx) des pixels d'un disque plein, tracé par cv2.circle
+    # lui-même : le tampon couvre exactement les mêmes pixels
+    size = 2 * radius + 1
+    canvas = np.zeros((size, size), dtype=np.uint8)
+    cv2.circle(canvas, (radius, radius), radius, 255, -1)
+    dy, dx = np.nonzero(canvas)
+    return dy - radius, dx - radius
+
+
+@functools.lru_cache(maxsize=32)
+def square_offsets(size):
+    # Carré de size x size pixels dont le point est le coin haut gauche
+    dy, dx = np.mgrid[0:size, 0:size]
+    return dy.ravel(), dx.ravel()
+
+
+def splat(frame, points, offsets, colors):
+    # Tamponne le motif offsets en chaque point (x, y) en une seule écriture
+    # indexée, au lieu d'un appel de dessin par point. colors est une couleur
+    # unique ou une couleur par point ; quand des motifs se recouvrent, le
+    # dernier point l'emporte, comme avec des appels successifs.
+    if not len(points):
+        return frame
+    height, width = frame.shape[:2]
+    dy, dx = offsets
+    x = points[:, 0:1].astype(np.intp)
+    y = points[:, 1:2].astype(np.intp)
+    index = y * width + x + (dy * width + dx)
+    colors = np.ascontiguousarray(colors, dtype=frame.dtype)
+    if colors.ndim == 2:
+        colors = np.broadcast_to(colors[:, None, :], index.shape + colors.shape[1:])
+
+    # Seuls les motifs qui débordent de l'image sont découpés
+    if (x.min() + dx.min() < 0 or x.max() + dx.max() >= width
+            or y.min() + dy.min() < 0 or y.max() + dy.max() >= height):
+        xs = x + dx
+        ys = y + dy
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        index = index[inside]
+        if colors.ndim == 3:
+            colors = colors[inside]
+    else:
+        index = index.ravel()
+        if colors.ndim == 3:
+            colors = colors.reshape(-1, colors.shape[-1])
+
+    if frame.flags.c_contiguous and frame.dtype == np.uint8 and frame.ndim == 3:
+        # Chaque pixel BGR vu comme un seul élément de 3 octets
+        pixels = frame.reshape(-1).view("V%d" % frame.shape[2])
+        values = np.ascontiguousarray(colors).view("V%d" % frame.shape[2]).reshape(-1)
+        np.put(pixels, index, values)
+    else:
+        frame[index // width, index % width] = colors
+    return frame
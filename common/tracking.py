@@ -0,0 +1,191 @@
+import cv2
+import numpy as np
+
+from common.inference import InferenceResults
+
+
+# Taille de la vignette utilisée pour mesurer le mouvement entre deux images
+MOTION_THUMBNAIL_SIZE = (64, 48)
+# Largeur maximale de l'image en niveaux de gris pour le flot optique
+FLOW_WIDTH = 640
+
+
+def flatten_results(results):
+    # Liste de (nom, points) : "pose", "face", et "left"/"right"/"hand"
+    groups = []
+    if results.pose is not None:
+        groups.append(("pose", results.pose))
+    for face in results.faces:
+        groups.append(("face", face))
+    for hand in results.hands:
+        if hand is results.left_hand:
+            name = "left"
+        elif hand is results.right_hand:
+            name = "right"
+        else:
+            name = "hand"
+        groups.append((name, hand))
+    return groups
+
+
+def rebuild_results(groups):
+    pose = left_hand = right_hand = None
+    faces = []
+    hands = []
+    for name, points in groups:
+        if name == "pose":
+            pose = points
+        elif name == "face":
+            faces.append(points)
+        else:
+            hands.append(points)
+            if name == "left":
+                left_hand = points
+            elif name == "right":
+                right_hand = points
+    return InferenceResults(pose, faces, left_hand, right_hand, hands)
+
+
+class KeyframeTracker:
+    # Lance l'inférence complète toutes les `interval` images, ou dès que le
+    # mouvement moyen entre deux images dépasse `motion_threshold` (en niveaux
+    # de gris, 0 pour désactiver). Entre deux détections, les points sont
+    # propagés par flot optique ("flow") ou à vitesse constante ("velocity").
+    # infer peut renvoyer None quand l'inférence n'a pas abouti (worker perdu
+    # ou en retard) : les points de la dernière détection sont alors propagés.
+    def __init__(self, interval=1, motion_threshold=0, method="flow"):
+        self.interval = interval
+        self.motion_threshold = motion_threshold
+        self.method = method
+        self.detected_frames = 0
+        self.propagated_frames = 0
+        self.last_motion = 0.0
+        self.last_detected = True
+        self.reset()
+
+    def reset(self):
+        self._needs = None
+        self._names = []
+        self._sizes = []
+        self._points = None
+        self._keyframe_points = None
+        self._velocity = None
+        self._since_keyframe = 0
+        self._prev_gray = None
+        self._prev_thumbnail = None
+        self._segmentation_mask = None
+
+    def stats(self):
+        return {
+            "detected": self.last_detected,
+            "detected_frames": self.detected_frames,
+            "propagated_frames": self.propagated_frames,
+            "motion": self.last_motion,
+            "interval": self.interval,
+            "motion_threshold": self.motion_threshold,
+        }
+
+    def process(self, frame, needs, infer):
+        if not needs:
+            self.reset()
+            self.last_detected = True
+            return InferenceResults()
+
+        gray = self._gray(frame)
+        thumbnail = cv2.resize(gray, MOTION_THUMBNAIL_SIZE,
+                               interpolation=cv2.INTER_AREA)
+        if self._prev_thumbnail is not None:
+            self.last_motion = float(cv2.absdiff(
+                thumbnail, self._prev_thumbnail).mean())
+
+        detect = (self._points is None
+                  or needs != self._needs
+                  or self._since_keyframe + 1 >= max(1, self.interval)
+                  or (self.motion_threshold and self.last_motion > self.motion_threshold))
+
+        results = infer(frame, needs) if detect else None
+        if results is not None:
+            self._store_keyframe(results, needs)
+            self.detected_frames += 1
+        elif self._points is None or needs != self._needs:
+            # Pas de résultat et rien à propager
+            results = InferenceResults()
+            results.detected = False
+        else:
+            self._propagate(gray)
+            results = rebuild_results(self._groups())
+            # Le masque de segmentation de la dernière détection est réutilisé
+            results.segmentation_mask = self._segmentation_mask
+            results.detected = False
+            self._since_keyframe += 1
+            self.propagated_frames += 1
+
+        self.last_detected = results.detected
+        self._prev_gray = gray
+        self._prev_thumbnail = thumbnail
+        return results
+
+    def _gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        if width > FLOW_WIDTH:
+            gray = cv2.resize(gray, (FLOW_WIDTH, height * FLOW_WIDTH // width),
+                              interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _store_keyframe(self, results, needs):
+        groups = flatten_results(results)
+        names = [name for name, _ in groups]
+        sizes = [len(array) for _, array in groups]
+        if groups:
+            points = np.concatenate([array for _, array in groups])
+        else:
+            points = np.zeros((0, 3), dtype=np.float32)
+
+        # Vitesse mesurée entre les deux dernières détections, si ce sont les
+        # mêmes groupes de points
+        if self._points is not None and names == self._names and sizes == self._sizes:
+            self._velocity = (points[:, :2] - self._keyframe_points[:, :2]) / \
+                (self._since_keyframe + 1)
+        else:
+            self._velocity = np.zeros((len(points), 2), dtype=np.float32)
+
+        self._needs = set(needs)
+        self._segmentation_mask = results.segmentation_mask
+        self._names = names
+        self._sizes = sizes
+        self._points = points
+        self._keyframe_points = points.copy()
+        self._since_keyframe = 0
+
+    def _propagate(self, gray):
+        points = self._points
+        if not len(points):
+            return
+
+        predicted = points[:, :2] + self._velocity
+        if self.method == "flow" and self._prev_gray is not None:
+            height, width = gray.shape
+            scale = np.array([width, height], dtype=np.float32)
+            previous = (points[:, :2] * scale).reshape(-1, 1, 2)
+            tracked, status, _ = cv2.calcOpticalFlowPyrLK(
+                self._prev_gray, gray, previous, None, winSize=(15, 15), maxLevel=2)
+            tracked = tracked.reshape(-1, 2) / scale
+            # Les points perdus par le flot optique gardent leur vitesse
+            lost = status.ravel() == 0
+            tracked[lost] = predicted[lost]
+            predicted = tracked
+
+        self._velocity = predicted - points[:, :2]
+        points[:, :2] = predicted
+
+    def _groups(self):
+        # Copie : les points suivants sont propagés pendant que les effets
+        # lisent ceux-ci dans un autre thread
+        points = self._points.copy()
+        groups = []
+        start = 0
+        for name, size in zip(self._names, self._sizes):
+            groups.append((name, points[start:start + size]))
+            start += size
+        return groups
@@ -0,0 +1,378 @@
+import itertools
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from common.inference import InferenceResults, model_kinds, prepare_input, process_kind
+from common.metrics import metrics
+from common.models import DEFAULT_OPTIONS, models
+
+
+# Inférence dans des processus séparés, chacun avec ses propres graphes
+# MediaPipe : les modèles échappent au GIL du processus principal. Les images
+# passent par des emplacements de mémoire partagée (anneau), seuls de petits
+# tableaux de points reviennent par la file de résultats.
+#
+# Deux façons d'occuper les workers, selon split_models :
+#   - True : chaque modèle d'une image est une tâche à part, Pose, FaceMesh
+#     et Hands tournent en parallèle sur la même image ;
+#   - False : une tâche par image, des images consécutives sont traitées en
+#     parallèle (pipeline, voir submit() et result()).
+
+# Délai maximal d'attente d'un résultat avant de considérer un worker perdu
+RESULT_TIMEOUT = 10.0
+# Pendant cette attente, intervalle entre deux vérifications des workers
+WORKER_CHECK_SECONDS = 0.5
+
+# Un anneau resté inutilisé aussi longtemps est supprimé (la taille d'image
+# d'une source a changé, ou la source est arrêtée)
+RING_IDLE_SECONDS = 5.0
+
+
+class FrameRing:
+    # Emplacements de mémoire partagée pour une taille d'image : l'image RGB
+    # réduite, suivie du masque de segmentation float32 écrit par le worker.
+    # acquire() et release() sont appelés sous le verrou du pool.
+    def __init__(self, slots, shape):
+        self.shape = shape
+        height, width = shape[:2]
+        self.frame_bytes = height * width * 3
+        self.mask_bytes = height * width * 4
+        self.segments = [shared_memory.SharedMemory(create=True,
+                                                    size=self.frame_bytes + self.mask_bytes)
+                         for _ in range(slots)]
+        self.names = [segment.name for segment in self.segments]
+        self._free = list(range(slots))
+        self.last_used = time.monotonic()
+
+    def acquire(self):
+        if not self._free:
+            return None
+        self.last_used = time.monotonic()
+        return self._free.pop()
+
+    def release(self, index):
+        self._free.append(index)
+
+    def idle(self):
+        return len(self._free) == len(self.segments)
+
+    def renew(self, index):
+        # Nouvelle mémoire pour l'emplacement : un worker en retard lit et
+        # écrit encore l'ancienne, qui n'appartient plus à l'anneau et ne
+        # peut donc plus abîmer l'image suivante
+        stale = self.segments[index]
+        self.segments[index] = shared_memory.SharedMemory(
+            create=True, size=self.frame_bytes + self.mask_bytes)
+        self.names[index] = self.segments[index].name
+        stale.close()
+        stale.unlink()
+
+    def frame(self, index):
+        return slot_frame(self.segments[index].buf, self.shape)
+
+    def mask(self, index):
+        return slot_mask(self.segments[index].buf, self.shape, self.frame_bytes)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+
+
+def slot_frame(buffer, shape):
+    return np.ndarray((shape[0], shape[1], 3), dtype=np.uint8, buffer=buffer)
+
+
+def slot_mask(buffer, shape, offset):
+    return np.ndarray(shape[:2], dtype=np.float32, buffer=buffer, offset=offset)
+
+
+def worker_main(tasks, results, options):
+    # Boucle d'un processus worker. Une tâche est (séquence, nom de
+    # l'emplacement, forme, modèles, génération, emplacements vivants) ; la
+    # réponse est (séquence, modèles, champs, durées) ou (séquence, modèles,
+    # None, message d'erreur).
+    from common.models import ModelManager
+
+    manager = ModelManager(options)
+    segments = {}
+    generation = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            sequence, name, shape, kinds, ring_generation, live = task
+            if generation is None or ring_generation > generation:
+                # Des anneaux ont été supprimés : on ferme nos accès à leurs
+                # emplacements, sans quoi leur mémoire ne serait jamais rendue.
+                # Une tâche plus ancienne, arrivée en retard, ne change rien.
+                generation = ring_generation
+                for stale in set(segments) - set(live):
+                    segments.pop(stale).close()
+            try:
+                segment = segments.get(name)
+                if segment is None:
+                    # Le segment appartient au processus principal, qui le
+                    # supprimera ; le worker (spawn) partage son resource_tracker
+                    segment = shared_memory.SharedMemory(name=name)
+                    segments[name] = segment
+                fields, durations = run_task(segment, shape, kinds, manager)
+                results.put((sequence, kinds, fields, durations))
+            except Exception as error:
+                results.put((sequence, kinds, None, repr(error)))
+    finally:
+        manager.close()
+        for segment in segments.values():
+            segment.close()
+
+
+def run_task(segment, shape, kinds, manager):
+    # Les vues sur le segment disparaissent au retour : il peut alors être
+    # fermé
+    rgb_frame = slot_frame(segment.buf, shape)
+    fields = {}
+    durations = {}
+    for kind in kinds:
+        start = time.perf_counter()
+        fields.update(process_kind(kind, rgb_frame, manager))
+        durations[kind] = time.perf_counter() - start
+    mask = fields.get("segmentation_mask")
+    if mask is not None:
+        # Le masque retourne par la mémoire partagée, pas par la file
+        np.copyto(slot_mask(segment.buf, shape, shape[0] * shape[1] * 3), mask)
+        fields["segmentation_mask"] = True
+    return fields, durations
+
+
+class InferencePool:
+    # Les processus ne sont lancés qu'à la première image : importer le
+    # module (y compris depuis un worker en mode spawn) ne démarre rien.
+    def __init__(self, workers=2, slots=None, split_models=True, use_holistic=False,
+                 inference_width=640, options=None):
+        self.workers = workers
+        # Assez d'emplacements pour occuper tous les workers, plus un en cours
+        # de remplissage
+        self.slots = slots or workers + 1
+        self.split_models = split_models
+        self.use_holistic = use_holistic
+        self.inference_width = inference_width
+        self.options = options or {kind: models.options(kind) for kind in DEFAULT_OPTIONS}
+        self._sequence = itertools.count()
+        self._context = None
+        self._processes = []
+        # Un anneau par taille d'image : des sources de tailles différentes
+        # partagent le pool sans recréer de mémoire partagée à chaque image.
+        # La génération change à chaque suppression d'anneau.
+        self._rings = {}
+        self._generation = 0
+        self._live = ()
+        # Images soumises : séquence -> [emplacement, anneau, parties
+        # attendues, champs, erreur]
+        self._pending = {}
+        self._done = {}
+        self._condition = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._collector = None
+        self._closed = False
+
+    def start(self):
+        with self._start_lock:
+            if self._processes or self._closed:
+                return
+            # spawn : MediaPipe et ses threads ne supportent pas fork
+            self._context = multiprocessing.get_context("spawn")
+            self._launch()
+
+    def _launch(self):
+        # Appelé sous _start_lock : files, workers et collecteur neufs
+        context = self._context
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(target=worker_main, name="inference-{}".format(index),
+                            args=(self._tasks, self._results, self.options),
+                            daemon=True)
+            for index in range(self.workers)]
+        for process in self._processes:
+            process.start()
+        self._collector = threading.Thread(target=self._collect, args=(self._results,),
+                                           daemon=True)
+        self._collector.start()
+
+    def restart_dead_workers(self):
+        # Un worker mort (plantage de MediaPipe, mémoire) a pu laisser les
+        # files verrouillées ou un message à moitié écrit : tous les workers
+        # repartent avec des files neuves. Les images en cours échouent tout
+        # de suite (RuntimeError dans result()) au lieu d'attendre le délai.
+        with self._start_lock:
+            if self._closed or all(process.is_alive() for process in self._processes):
+                return
+            for process in self._processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in self._processes:
+                process.join()
+            tasks, results = self._tasks, self._results
+            self._launch()
+            metrics.count("worker_restarts", "inference")
+        # L'ancien collecteur s'arrête s'il peut encore lire sa file, qui
+        # n'est donc pas fermée ici. Aucune des deux ne doit retenir la sortie
+        # du processus.
+        results.put(None)
+        results.cancel_join_thread()
+        tasks.close()
+        tasks.cancel_join_thread()
+        with self._condition:
+            for sequence in list(self._pending):
+                self._abandon(sequence)
+                self._done[sequence] = ({}, "worker redémarré")
+
+    def submit(self, frame, needs, block=False, inference_width=None):
+        # Envoie l'image aux workers et renvoie son numéro de séquence, à
+        # passer à result(). Sans emplacement libre, renvoie None (block=False)
+        # ou attend qu'un emplacement se libère.
+        self.start()
+        self.restart_dead_workers()
+        kinds = model_kinds(needs, self.use_holistic)
+        rgb_frame = prepare_input(frame, inference_width or self.inference_width)
+        parts = [[kind] for kind in kinds] if self.split_models else [kinds]
+        with self._condition:
+            # Emplacement pris et image enregistrée d'un seul tenant : un
+            # anneau qui a une image en cours n'est jamais supprimé
+            ring = self._ring_for(rgb_frame.shape)
+            index = ring.acquire()
+            while index is None:
+                if not block:
+                    return None
+                self._condition.wait()
+                ring = self._ring_for(rgb_frame.shape)
+                index = ring.acquire()
+            sequence = next(self._sequence)
+            self._pending[sequence] = [index, ring, len(parts), {}, None]
+            generation, live = self._generation, self._live
+        np.copyto(ring.frame(index), rgb_frame)
+
+        name = ring.names[index]
+        for part in parts:
+            self._tasks.put((sequence, name, rgb_frame.shape, part, generation, live))
+        return sequence
+
+    def result(self, sequence, timeout=RESULT_TIMEOUT):
+        # InferenceResults de l'image sequence. Chaque séquence soumise doit
+        # être réclamée une fois, dans n'importe quel ordre : les résultats
+        # arrivés en avance attendent leur tour.
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                remaining = deadline - time.monotonic()
+                if sequence not in self._done and remaining > 0:
+                    self._condition.wait(min(remaining, WORKER_CHECK_SECONDS))
+                if sequence in self._done:
+                    fields, error = self._done.pop(sequence)
+                    break
+                if time.monotonic() >= deadline:
+                    # Worker bloqué : un résultat tardif sera ignoré
+                    self._abandon(sequence)
+                    raise TimeoutError("Aucun résultat d'inférence pour l'image {}".format(sequence))
+            # Un worker mort ne rendra jamais ses tâches : il est remplacé
+            # sans attendre la fin du délai
+            self.restart_dead_workers()
+        if error is not None:
+            raise RuntimeError("Échec de l'inférence dans un worker : {}".format(error))
+        return InferenceResults(**fields)
+
+    def infer(self, frame, needs, inference_width=None):
+        # Remplace run_inference : les modèles de l'image tournent en
+        # parallèle dans les workers
+        if not needs:
+            return InferenceResults()
+        return self.result(self.submit(frame, needs, block=True,
+                                       inference_width=inference_width))
+
+    def _abandon(self, sequence):
+        # Appelé sous self._condition. Un worker en retard peut encore lire
+        # l'image et écrire son masque : l'emplacement est rendu avec une
+        # mémoire neuve, et les workers ferment leur accès à l'ancienne.
+        entry = self._pending.pop(sequence, None)
+        if entry is not None:
+            index, ring = entry[0], entry[1]
+            ring.renew(index)
+            ring.release(index)
+            self._update_live()
+            self._condition.notify_all()
+
+    def _ring_for(self, shape):
+        # Appelé sous self._condition
+        self._retire_idle_rings(shape)
+        ring = self._rings.get(shape)
+        if ring is None:
+            ring = self._rings[shape] = FrameRing(self.slots, shape)
+            self._update_live()
+        return ring
+
+    def _retire_idle_rings(self, keep):
+        now = time.monotonic()
+        retired = [shape for shape, ring in self._rings.items()
+                   if shape != keep and ring.idle()
+                   and now - ring.last_used > RING_IDLE_SECONDS]
+        for shape in retired:
+            self._rings.pop(shape).close()
+        if retired:
+            self._update_live()
+
+    def _update_live(self):
+        # Les tâches suivantes portent la nouvelle génération : chaque worker
+        # ferme alors ses accès aux emplacements qui ne sont plus vivants
+        self._generation += 1
+        self._live = tuple(name for ring in self._rings.values() for name in ring.names)
+
+    def _collect(self, results):
+        while True:
+            message = results.get()
+            if message is None:
+                break
+            sequence, kinds, fields, info = message
+            with self._condition:
+                entry = self._pending.get(sequence)
+                if entry is None:
+                    # Image abandonnée après un délai dépassé
+                    continue
+                index, ring, _, merged, _ = entry
+                if fields is None:
+                    entry[4] = info
+                else:
+                    if fields.pop("segmentation_mask", None):
+                        merged["segmentation_mask"] = ring.mask(index).copy()
+                    merged.update(fields)
+                    for kind, seconds in info.items():
+                        metrics.observe("model", kind, seconds)
+                entry[2] -= 1
+                if entry[2] == 0:
+                    del self._pending[sequence]
+                    ring.release(index)
+                    self._done[sequence] = (merged, entry[4])
+                    self._condition.notify_all()
+
+    def close(self):
+        with self._start_lock:
+            self._closed = True
+            processes, self._processes = self._processes, []
+        if not processes:
+            return
+        for _ in processes:
+            self._tasks.put(None)
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join()
+        with self._condition:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Le dossier parent contient le paquet common, comme pour les deux versions
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
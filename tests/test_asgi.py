@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("httpx")
+
+from starlette.testclient import TestClient
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Web version")
+sys.path.insert(0, WEB_DIR)
+
+import asgi
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Un fichier remplace la caméra : le flux s'arrête à sa dernière image
+    # (TestClient attend la fin du flux MJPEG). Ralenti comme une caméra,
+    # il ne se termine pas avant les réponses attendues sur le WebSocket.
+    path = str(tmp_path / "camera.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (160, 120))
+    for index in range(60):
+        writer.write(np.full((120, 160, 3), index * 4, dtype=np.uint8))
+    writer.release()
+    process_frame = asgi.broadcaster.process_frame
+
+    def paced(frame):
+        time.sleep(0.02)
+        return process_frame(frame)
+
+    monkeypatch.setattr(asgi.broadcaster, "source", path)
+    monkeypatch.setattr(asgi.broadcaster, "process_frame", paced)
+    with TestClient(asgi.app) as client:
+        yield client
+    asgi.broadcaster.stop()
+
+
+def wait_released(hub, timeout=10):
+    # Le désabonnement du dernier client se fait dans une tâche
+    deadline = time.monotonic() + timeout
+    while (hub.clients or hub.subscribed) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not hub.clients and not hub.subscribed
+
+
+def test_video_feed_streams_jpeg(client):
+    with client.stream("GET", "/video_feed") as response:
+        assert response.headers["content-type"].startswith("multipart/x-mixed-replace")
+        body = b""
+        for chunk in response.iter_bytes():
+            body += chunk
+            if body.count(b"--frame") >= 2:
+                break
+    assert b"Content-Type: image/jpeg" in body
+    start = body.index(b"\r\n\r\n") + 4
+    assert body[start:start + 2] == b"\xff\xd8"
+    assert wait_released(asgi.hub)
+
+
+def test_websocket_frames_and_updates(client):
+    with client.websocket_connect("/ws") as websocket:
+        frame = websocket.receive_bytes()
+        assert frame[:2] == b"\xff\xd8"
+        websocket.send_json({"blur_intensity": 3})
+        # Les images continuent d'arriver avant la réponse
+        while True:
+            message = websocket.receive()
+            if message.get("text"):
+                break
+        assert '"success":true' in message["text"].replace(" ", "")
+        websocket.send_json({"blur_intensity": -1})
+        while True:
+            message = websocket.receive()
+            if message.get("text"):
+                break
+        assert '"success":false' in message["text"].replace(" ", "")
+    assert wait_released(asgi.hub)
+
+
+def test_update_effects_and_stats(client):
+    response = client.post("/update_effects", json={"selected_effects": ["Nope"]})
+    assert response.status_code == 400
+    response = client.post("/update_effects", json={"selected_effects": ["Sepia"]})
+    assert response.json()["success"]
+    stats = client.get("/stats").json()
+    assert "tracking" in stats
+    assert client.get("/metrics").status_code == 200
+
+
+def test_client_leaving_during_subscription():
+    # Un client qui part pendant que la caméra démarre ne laisse pas le
+    # hub abonné
+    import asyncio
+    import threading
+
+    class SlowBroadcaster:
+        def __init__(self):
+            self.subscribers = []
+            self.started = threading.Event()
+
+        def add_subscriber(self, subscriber):
+            self.started.set()
+            threading.Event().wait(0.3)
+            self.subscribers.append(subscriber)
+
+        def unsubscribe(self, subscriber):
+            self.subscribers.remove(subscriber)
+
+    broadcaster = SlowBroadcaster()
+
+    async def scenario():
+        hub = asgi.AsyncFrameHub(broadcaster)
+
+        async def client():
+            try:
+                await hub.join()
+                await asyncio.sleep(10)
+            finally:
+                hub.leave()
+
+        task = asyncio.create_task(client())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        while hub._tasks:
+            await asyncio.sleep(0.01)
+        return hub
+
+    hub = asyncio.run(scenario())
+    assert broadcaster.started.is_set()
+    assert hub.clients == 0 and not hub.subscribed
+    assert broadcaster.subscribers == []
@@ -0,0 +1,26 @@
+import numpy as np
+
+from common.effects import EFFECTS, compile_chain
+from common.lut import ChannelLUTStep, ColorLUTStep
+
+NEUTRAL = {"brightness": 0, "contrast": 0}
+
+
+def test_neutral_channel_step_leaves_a_single_effect_native():
+    chain = compile_chain(["Sepia", "Brightness/Contrast"], NEUTRAL)
+    assert chain.labels == ["Sepia"]
+    assert chain.steps[0].func is EFFECTS["Sepia"].func
+    frame = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    expected = compile_chain(["Sepia"], NEUTRAL)(frame.copy(), None)
+    assert np.array_equal(chain(frame.copy(), None), expected)
+
+
+def test_neutral_run_is_dropped():
+    assert compile_chain(["Brightness/Contrast"], NEUTRAL).steps == []
+
+
+def test_active_steps_are_still_fused():
+    chain = compile_chain(["Sepia", "Brightness/Contrast"], {"brightness": 20, "contrast": 0})
+    assert isinstance(chain.steps[0], ColorLUTStep)
+    chain = compile_chain(["Brightness/Contrast"], {"brightness": 20, "contrast": 0})
+    assert isinstance(chain.steps[0], ChannelLUTStep)
@@ -0,0 +1,103 @@
+import queue
+
+import cv2
+import numpy as np
+import pytest
+
+from common import engine as engine_module
+from common.engine import MultiSourceEngine, Source
+from common.workers import InferencePool
+
+
+def write_clip(path, size, frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 25, size)
+    for index in range(frames):
+        frame = np.full((size[1], size[0], 3), index * 8 % 256, dtype=np.uint8)
+        cv2.circle(frame, (size[0] // 2, size[1] // 2), size[1] // 4, (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def clips(tmp_path):
+    # Deux tailles et deux proportions différentes
+    return [write_clip(tmp_path / "a.avi", (640, 480), 20),
+            write_clip(tmp_path / "b.avi", (320, 180), 12)]
+
+
+def drain(subscriber):
+    frames = []
+    while True:
+        try:
+            frames.append(subscriber.get(timeout=0))
+        except queue.Empty:
+            return frames
+
+
+def run(engine, timeout=60):
+    engine.start()
+    try:
+        assert engine.wait(timeout)
+    finally:
+        engine.stop()
+
+
+def test_files_processed_frame_by_frame(clips):
+    sources = [Source(clip, name=name, settings={"selected_effects": ["Sepia"]},
+                      realtime=False)
+               for name, clip in zip(("a", "b"), clips)]
+    engine = MultiSourceEngine(sources, workers=2)
+    subscribers = {name: engine.subscribe(name, 32, lossless=True) for name in ("a", "b")}
+    run(engine)
+
+    stats = engine.stats()
+    assert [stats[name]["processed_frames"] for name in ("a", "b")] == [20, 12]
+    assert [stats[name]["dropped_frames"] for name in ("a", "b")] == [0, 0]
+    assert [len(drain(subscribers[name])) for name in ("a", "b")] == [20, 12]
+
+
+def test_rtsp_urls_mocked_by_files(clips, monkeypatch):
+    # Des URL rtsp:// lues depuis des fichiers : les sources se comportent
+    # comme des flux réseau (cadence libre, images perdues possibles)
+    urls = {"rtsp://camera/1": clips[0], "rtsp://camera/2": clips[1]}
+    open_capture = cv2.VideoCapture
+    monkeypatch.setattr(engine_module.cv2, "VideoCapture",
+                        lambda uri: open_capture(urls.get(uri, uri)))
+    sources = [Source(url) for url in urls]
+    assert not any(source.is_file for source in sources)
+    engine = MultiSourceEngine(sources, grid=True, grid_size=(320, 180), grid_fps=100)
+    grid = engine.subscribe("grid", 4)
+    engine.start()
+    try:
+        assert engine.wait(60)
+        # La grille continue d'être publiée après la fin des sources
+        frames = [grid.get(timeout=5)]
+    finally:
+        engine.stop()
+
+    stats = engine.stats()
+    assert [stats[url]["captured_frames"] for url in urls] == [20, 12]
+    for url in urls:
+        assert stats[url]["processed_frames"] + stats[url]["dropped_frames"] == \
+            stats[url]["captured_frames"]
+        assert stats[url]["processed_frames"] > 0
+    frames += drain(grid)
+    assert all(frame.shape == (180, 320, 3) for frame in frames)
+
+
+def test_shared_inference_pool_with_mixed_shapes(clips):
+    # Deux tailles d'image sur le même pool : un anneau de mémoire partagée
+    # par taille, aucune image perdue ni erreur de worker
+    pool = InferencePool(1)
+    try:
+        sources = [Source(clip, name=name, realtime=False,
+                          settings={"selected_effects": ["Background Distortion"]})
+                   for name, clip in zip(("a", "b"), clips)]
+        engine = MultiSourceEngine(sources, workers=2, inference_pool=pool)
+        run(engine, timeout=300)
+        stats = engine.stats()
+        assert [stats[name]["processed_frames"] for name in ("a", "b")] == [20, 12]
+        assert len(pool._rings) == 2
+    finally:
+        pool.close()
@@ -0,0 +1,42 @@
+from common.governor import QualityGovernor, apply_tier
+
+
+def simulate(governor, costs, frames):
+    changes = []
+    for frame in range(frames):
+        governor.observe("frame", costs[governor.tier])
+        if governor.update():
+            changes.append((frame, governor.tier))
+    return changes
+
+
+def test_disabled_by_default():
+    governor = QualityGovernor()
+    assert not governor.enabled
+    assert simulate(governor, [1.0] * 6, 200) == []
+    settings = {"inference_width": 1280, "blur_intensity": 3}
+    assert apply_tier(settings, governor.settings()) == dict(
+        settings, kernel_scale=1.0, splat_step=1)
+
+
+def test_steps_down_until_the_budget_holds():
+    governor = QualityGovernor(25, hold_frames=10)
+    changes = simulate(governor, [0.060, 0.055, 0.050, 0.045, 0.030, 0.025], 500)
+    assert [tier for _, tier in changes] == [1, 2, 3, 4]
+    assert governor.settings()["kernel_scale"] == 0.5
+
+
+def test_backs_off_when_the_upper_tier_does_not_hold():
+    governor = QualityGovernor(25, hold_frames=10, max_hold_frames=160)
+    changes = simulate(governor, [0.060, 0.055, 0.045, 0.027, 0.026, 0.025], 3000)
+    # Entre 2 et 3 seulement, et de plus en plus rarement
+    assert {tier for _, tier in changes[2:]} <= {2, 3}
+    gaps = [b[0] - a[0] for a, b in zip(changes[2::2], changes[4::2])]
+    assert gaps == sorted(gaps) and gaps[-1] > gaps[0]
+
+
+def test_tier_caps_inference_width():
+    governor = QualityGovernor(25)
+    governor.tier = 2
+    assert apply_tier({"inference_width": 640}, governor.settings())["inference_width"] == 320
+    assert apply_tier({"inference_width": 160}, governor.settings())["inference_width"] == 160
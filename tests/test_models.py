@@ -0,0 +1,75 @@
+import pytest
+
+from common import models as models_module
+from common.governor import TIERS, configure_models
+from common.models import ModelManager, model_available
+
+
+class FakeGraph:
+    def __init__(self, options):
+        self.options = options
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def factories(monkeypatch):
+    # Graphes factices : une complexité dans failing fait échouer la construction
+    failing = set()
+
+    def build(options):
+        if options.get("model_complexity") in failing:
+            raise OSError("modèle introuvable")
+        return FakeGraph(options)
+
+    monkeypatch.setattr(models_module, "_FACTORIES",
+                        {kind: build for kind in models_module._FACTORIES})
+    monkeypatch.setattr(models_module, "model_available", lambda kind, options: True)
+    return failing
+
+
+def test_rebuild_replaces_the_graph_once_ready(factories):
+    manager = ModelManager()
+    previous = manager.get("pose")
+    assert manager.configure("pose", model_complexity=2)
+    assert previous.closed
+    assert manager.get("pose").options["model_complexity"] == 2
+
+
+def test_failed_rebuild_keeps_the_previous_graph(factories):
+    manager = ModelManager()
+    previous = manager.get("pose")
+    factories.add(0)
+    assert not manager.configure("pose", model_complexity=0)
+    assert manager.get("pose") is previous and not previous.closed
+    assert manager.options("pose")["model_complexity"] == 1
+
+
+def test_failed_lazy_build_falls_back_to_the_last_options(factories):
+    manager = ModelManager()
+    manager.get("pose")
+    manager.close()
+    factories.add(0)
+    assert manager.configure("pose", model_complexity=0)
+    assert manager.get("pose").options["model_complexity"] == 1
+    assert manager.options("pose")["model_complexity"] == 1
+
+
+def test_complexity_without_local_model_is_skipped(monkeypatch):
+    # Comme le paquet mediapipe : pas de modèle Pose lite, Hands lite présent
+    monkeypatch.setattr(models_module, "model_available",
+                        lambda kind, options: kind == "hands"
+                        or options.get("model_complexity") != 0)
+    manager = ModelManager()
+    configure_models(TIERS[-1], manager)
+    assert manager.options("pose")["model_complexity"] == 1
+    assert manager.options("holistic")["model_complexity"] == 1
+    assert manager.options("hands")["model_complexity"] == 0
+
+
+def test_model_available_checks_the_pose_files():
+    assert model_available("face", {})
+    assert model_available("pose", {"model_complexity": 1})
+    assert not model_available("pose", {"model_complexity": 5})
@@ -0,0 +1,25 @@
+import threading
+
+from common.pipeline import LatestQueue, PipelineStage
+
+
+def test_stage_survives_a_failing_item():
+    def halve(value):
+        if value == 1:
+            raise ValueError("image illisible")
+        return value // 2
+
+    stop_event = threading.Event()
+    inbox = LatestQueue(maxsize=3)
+    outbox = LatestQueue(maxsize=3)
+    stage = PipelineStage("halve", halve, inbox, outbox, stop_event, poll_interval=0.01)
+    stage.start()
+    try:
+        for value in (4, 1, 8):
+            inbox.put(value)
+        assert [outbox.get(timeout=5) for _ in range(2)] == [2, 4]
+        assert stage.is_alive()
+        assert stage.errors == 1
+    finally:
+        stop_event.set()
+        stage.join()
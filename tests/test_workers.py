@@ -0,0 +1,72 @@
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from common.tracking import KeyframeTracker
+from common.workers import InferencePool
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(1, slots=1, inference_width=160)
+    yield pool
+    pool.close()
+
+
+def test_timed_out_slot_gets_fresh_memory(pool):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    first = pool.submit(frame, {"segmentation"}, block=True)
+    ring = pool._rings[(120, 160, 3)]
+    stale = ring.names[0]
+    with pytest.raises(TimeoutError):
+        pool.result(first, timeout=0)
+    # Le worker en retard écrit dans l'ancienne mémoire, pas dans celle de
+    # l'image suivante
+    assert ring.names[0] != stale
+    assert stale not in pool._live
+    second = pool.submit(frame + 200, {"segmentation"}, block=True)
+    results = pool.result(second, timeout=60)
+    assert results.segmentation_mask.shape == (120, 160)
+
+
+def test_dead_worker_is_restarted(pool):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    pool.infer(frame, {"segmentation"})
+    dead = pool._processes[0]
+    dead.kill()
+    dead.join()
+    results = pool.infer(frame, {"segmentation"})
+    assert results.segmentation_mask is not None
+    assert pool._processes[0] is not dead and pool._processes[0].is_alive()
+
+
+def test_frame_in_flight_fails_fast_when_its_worker_dies(pool):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    pool.infer(frame, {"segmentation"})
+    # Worker figé : l'image ne peut pas aboutir avant sa mort
+    worker = pool._processes[0]
+    os.kill(worker.pid, signal.SIGSTOP)
+    sequence = pool.submit(frame, {"segmentation"}, block=True)
+    worker.kill()
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        pool.result(sequence)
+    assert time.monotonic() - start < 5
+    assert pool.infer(frame, {"segmentation"}).segmentation_mask is not None
+
+
+def test_tracker_propagates_when_inference_fails():
+    from common.inference import InferenceResults
+
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    tracker = KeyframeTracker(interval=1)
+    results = tracker.process(frame, {"pose"}, lambda frame, needs: None)
+    assert not results.detected and results.pose is None
+    pose = np.full((33, 3), 0.5, dtype=np.float32)
+    tracker.process(frame, {"pose"}, lambda frame, needs: InferenceResults(pose=pose))
+    results = tracker.process(frame, {"pose"}, lambda frame, needs: None)
+    assert not results.detected
+    assert np.allclose(results.pose, pose)